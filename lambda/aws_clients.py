@@ -0,0 +1,66 @@
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Connection pool size used when callers don't ask for more
+DEFAULT_POOL_CONNECTIONS = 10
+
+# Config options for clients called through rate_limit.RateLimitedCaller, which
+# does the retrying itself: botocore makes a single attempt (no retries), so every
+# request passes the caller's rate limiter and shows up in its retry and drop counts
+CALLER_RETRIES = {'retry_mode': 'standard', 'max_attempts': 0}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def make_config(max_pool_connections=DEFAULT_POOL_CONNECTIONS, max_attempts=3, retry_mode='adaptive',
+                connect_timeout=5, read_timeout=30):
+    """
+    botocore Config tuned for many concurrent short requests
+
+    Adaptive retry mode adds client-side rate limiting on top of retries, the
+    connection pool is sized for the caller's concurrency, and TCP keep-alive
+    keeps pooled connections (and their TLS sessions) usable between bursts.
+    max_attempts counts retries after the first attempt, as in botocore (the
+    default of 3 allows 4 calls); see CALLER_RETRIES for clients that are
+    retried by a RateLimitedCaller instead.
+    """
+    return Config(
+        max_pool_connections=max_pool_connections,
+        retries={'mode': retry_mode, 'max_attempts': max_attempts},
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        tcp_keepalive=True,
+    )
+
+
+def get_client(service_name, region_name=None, endpoint_url=None,
+               max_pool_connections=DEFAULT_POOL_CONNECTIONS, **config_options):
+    """
+    Return a shared client for a service, creating it on first use
+
+    boto3 clients are thread-safe, so one client per (service, region, endpoint,
+    config options) is shared by every worker and its connection pool is reused.
+    Asking for a larger pool than the existing client has replaces it with a
+    bigger one; holders of the old client can keep using it.
+    """
+    key = (service_name, region_name, endpoint_url, tuple(sorted(config_options.items())))
+    with _lock:
+        entry = _clients.get(key)
+        if entry is None or entry[1] < max_pool_connections:
+            client = boto3.session.Session().client(
+                service_name,
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=make_config(max_pool_connections, **config_options),
+            )
+            entry = _clients[key] = (client, max_pool_connections)
+        return entry[0]
+
+
+def clear_clients():
+    """Forget all shared clients (new ones are created on next use)"""
+    with _lock:
+        _clients.clear()
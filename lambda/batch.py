@@ -0,0 +1,386 @@
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+
+from aws_clients import get_client
+from buffer_pool import BufferPool
+from bulk_analysis import BulkImageAnalyzer, OUTPUTS, local_job, s3_job
+from checkpoint import CheckpointJournal, atomic_write
+from fake_aws import FakeRekognitionClient
+from image_prep import ImagePreprocessor
+from incremental import IncrementalPlan
+from images import REKOGNITION_OPERATIONS, RekognitionImageTester
+from metrics import METRICS
+from rate_limit import RateLimitedCaller, RateLimiter
+from render_pool import RenderPool
+from result_cache import ResultCache
+from result_index import ResultIndex, parse_query
+from results_store import STORE_FORMATS, ResultsStore
+from s3_utils import iter_bucket_objects, key_matches
+
+
+def parse_s3_uri(uri):
+    """Split s3://bucket/key-or-prefix into (bucket, key)"""
+    if not uri.startswith('s3://'):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    if not bucket:
+        raise ValueError(f"S3 URI has no bucket: {uri}")
+    return bucket, key
+
+
+def iter_directory(directory):
+    """Yield image paths under a directory, recursively and in sorted order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if key_matches(filename):
+                yield os.path.join(root, filename)
+
+
+def iter_manifest(path):
+    """Yield entries (local paths or s3:// URIs) from a manifest, one per line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+class JobSource:
+    """Builds bulk jobs from the batch command's inputs, creating the S3 client on demand"""
+
+    def __init__(self, args, plan=None, buffer_pool=None):
+        """
+        plan: optional IncrementalPlan filtering S3 listings down to new and changed objects
+        buffer_pool: optional BufferPool S3 objects are streamed into
+        """
+        self.args = args
+        self.plan = plan
+        self.buffer_pool = buffer_pool
+        self._s3 = None
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            self._s3 = get_client('s3', region_name=self.args.region,
+                                  max_pool_connections=self.args.workers)
+        return self._s3
+
+    def _s3_object_job(self, bucket, key, etag=None, last_modified=None, size=None):
+        return s3_job(self.s3, bucket, key, etag, self.args.s3_object, last_modified, self.buffer_pool, size)
+
+    def __iter__(self):
+        args = self.args
+        for directory in args.dir:
+            for path in iter_directory(directory):
+                yield local_job(path)
+
+        for pattern in args.glob:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    yield local_job(path)
+
+        for uri in args.s3:
+            bucket, prefix = parse_s3_uri(uri)
+            objects = iter_bucket_objects(self.s3, bucket, prefix=prefix, start_after=args.start_after)
+            if self.plan is not None:
+                objects = self.plan.filter(bucket, prefix, objects)
+            for obj in objects:
+                yield self._s3_object_job(bucket, obj['Key'], obj.get('ETag'), obj.get('LastModified'),
+                                          obj.get('Size'))
+
+        for manifest in args.manifest:
+            for entry in iter_manifest(manifest):
+                if entry.startswith('s3://'):
+                    yield self._s3_object_job(*parse_s3_uri(entry))
+                else:
+                    yield local_job(entry)
+
+
+def build_parser():
+    """Argument parser for the batch command"""
+    parser = argparse.ArgumentParser(
+        prog='batch.py',
+        description='Analyze images with AWS Rekognition in bulk, without prompts',
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Analyze a set of images')
+    inputs = run.add_argument_group('inputs (repeatable, combined in order)')
+    inputs.add_argument('--dir', action='append', default=[], help='Local directory, searched recursively')
+    inputs.add_argument('--glob', action='append', default=[], help="Glob pattern such as 'photos/**/*.jpg'")
+    inputs.add_argument('--s3', action='append', default=[], help='S3 prefix as s3://bucket/prefix')
+    inputs.add_argument('--manifest', action='append', default=[],
+                        help='File listing one local path or s3://bucket/key per line')
+
+    run.add_argument('--start-after', help='Resume S3 listings after this key')
+    run.add_argument('--region', default='us-east-1', help='AWS region (default: us-east-1)')
+    run.add_argument('--endpoint-url', help='Rekognition endpoint to use instead of AWS')
+    run.add_argument('--fake', action='store_true',
+                     help='Use the offline Rekognition stand-in instead of AWS (no API spend)')
+    run.add_argument('--fake-latency', type=float, default=0.05,
+                     help='Seconds each stand-in call takes (default: 0.05)')
+    run.add_argument('--workers', type=int, default=8, help='Images processed in parallel (default: 8)')
+    run.add_argument('--max-in-flight', type=int, help='Queued images allowed (default: 2 x workers)')
+    run.add_argument('--download-budget', type=float,
+                     help='Megabytes of S3 download buffers shared by all workers; downloads wait '
+                          'while it is used up (default: unbounded)')
+    run.add_argument('--tps', type=float,
+                     help='Maximum calls per second for each Rekognition operation (your account quota)')
+    run.add_argument('--max-attempts', type=int, default=6,
+                     help='Attempts per call before a throttled call is dropped (default: 6)')
+    run.add_argument('--operations', default='faces,labels',
+                     help=f"Comma separated Rekognition operations from: {', '.join(REKOGNITION_OPERATIONS)}")
+    run.add_argument('--outputs', default='json',
+                     help=f"Comma separated outputs from: {', '.join(OUTPUTS)}, or 'none' (default: json)")
+    run.add_argument('--renderer', choices=('matplotlib', 'raster'), default='matplotlib',
+                     help="How detection images are drawn: the matplotlib figure or 'raster' "
+                          "(OpenCV, much faster)")
+    run.add_argument('--summary-template', action='store_true',
+                     help='Reuse one pre-built summary figure per worker instead of building one per image')
+    run.add_argument('--render-processes', type=int,
+                     help='Render visualizations in this many worker processes (0 for one per CPU)')
+    run.add_argument('--dashboard-every', type=int,
+                     help="With the 'dashboard' output, also save a snapshot every N images")
+    run.add_argument('--output-dir', default='rekognition_output', help='Where outputs are written')
+    run.add_argument('--s3-object', action='store_true',
+                     help='Let Rekognition read S3 images directly instead of downloading them')
+    run.add_argument('--max-dimension', type=int,
+                     help='Downscale images larger than this many pixels on a side before sending them')
+    run.add_argument('--jpeg-quality', type=int, default=85,
+                     help='JPEG quality for downscaled images (default: 85)')
+    run.add_argument('--memmap-megapixels', type=float,
+                     help='Decode images of at least this many megapixels into memory-mapped temporary files')
+    run.add_argument('--store', help='Append every result to this Parquet/Lance dataset')
+    run.add_argument('--store-format', choices=STORE_FORMATS, default='parquet',
+                     help='Dataset format for --store (default: parquet)')
+    run.add_argument('--store-batch-size', type=int, default=1000,
+                     help='Rows written to the dataset at a time (default: 1000)')
+    run.add_argument('--index', help='Add every result to this label/face attribute index file')
+    run.add_argument('--incremental', action='store_true',
+                     help='Only analyze S3 objects that are new or changed since they were added to --store, '
+                          'and delete stored results of objects that no longer exist')
+    run.add_argument('--checkpoint',
+                     help='Journal of completed images; rerunning with the same file skips them')
+    run.add_argument('--cache-dir', default='rekognition_cache', help='Result cache directory')
+    run.add_argument('--no-cache', action='store_true', help='Disable the result cache')
+    run.add_argument('--metrics-file',
+                     help='Export stage metrics here (.prom for Prometheus text, .jsonl for JSON lines)')
+    run.add_argument('--metrics-interval', type=float, default=15.0,
+                     help='Seconds between metrics file updates during the run (default: 15)')
+    run.add_argument('--summary-json', help="Where to write the run summary ('-' for stdout, "
+                                            "default: <output-dir>/batch_summary.json)")
+
+    query = subparsers.add_parser('query', help='Find analyzed images in an index built with run --index')
+    query.add_argument('index', help='Index file')
+    query.add_argument('terms', nargs='*',
+                       help="Terms every image must match, optionally with a minimum confidence: "
+                            "'label:Car>=90', 'face:sunglasses', 'emotion:happy>=80', 'gender:female'")
+    query.add_argument('--list-terms', action='store_true', help='List indexed terms and their image counts')
+    query.add_argument('--limit', type=int, help='Print at most this many images')
+    query.add_argument('--compact', action='store_true', help='Rewrite the index file without stale entries')
+    return parser
+
+
+def split_list(value):
+    """Parse a comma separated option value"""
+    return [item.strip() for item in value.split(',') if item.strip() and item.strip() != 'none']
+
+
+def combine_callbacks(callbacks):
+    """One on_result callback calling each of callbacks in turn (None if there are none)"""
+    if not callbacks:
+        return None
+
+    def on_result(job, results):
+        for callback in callbacks:
+            callback(job, results)
+    return on_result
+
+
+def apply_incremental(plan, report, store, index=None):
+    """Delete stored results of removed and re-analyzed objects after an incremental run"""
+    removed = plan.removed()
+    replaced = plan.replaced(failure['source'] for failure in report['failures'])
+    rows_deleted = store.delete_stale(removed, replaced)
+    if index is not None:
+        for source in removed:
+            index.remove(source)
+
+    stats = {**plan.stats(), 'removed': len(removed), 'rows_deleted': rows_deleted}
+    print(f"🔁 Incremental: {stats['new']} new, {stats['changed']} changed, "
+          f"{stats['unchanged']} unchanged, {stats['removed']} removed ({rows_deleted} stale rows deleted)")
+    return stats
+
+
+def query(args):
+    """Print images in an index matching every term"""
+    if not os.path.exists(args.index):
+        print(f"❌ No index at {args.index}")
+        return 2
+    try:
+        for expression in args.terms:
+            parse_query(expression)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    index = ResultIndex(args.index)
+    try:
+        if args.compact:
+            index.compact()
+            print(f"🗜️  Compacted {args.index}: {len(index)} images")
+        if args.list_terms:
+            for term, count in sorted(index.terms().items(), key=lambda item: (-item[1], item[0])):
+                print(f"{count:>8}  {term}")
+            return 0
+        if not args.terms:
+            return 0 if args.compact else 2
+
+        start = time.perf_counter()
+        matches = index.search(args.terms)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for image_id in matches[:args.limit] if args.limit else matches:
+            print(image_id)
+        print(f"🔎 {len(matches)} of {len(index)} images matched in {elapsed_ms:.2f}ms", file=sys.stderr)
+        return 0 if matches else 1
+    finally:
+        index.close()
+
+
+def run(args):
+    """Run a batch and write its summary, returning the process exit code"""
+    if args.summary_json != '-':
+        return _run(args)
+    # stdout carries only the summary JSON; banners and progress go to stderr
+    summary_stream = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return _run(args, summary_stream)
+
+
+def _run(args, summary_stream=None):
+    if not (args.dir or args.glob or args.s3 or args.manifest):
+        print("❌ No inputs given (use --dir, --glob, --s3 or --manifest)")
+        return 2
+    if args.incremental and not args.store:
+        print("❌ --incremental compares listings against a results dataset; give it with --store")
+        return 2
+    if args.incremental and args.start_after:
+        print("❌ --incremental needs complete listings and can't be combined with --start-after")
+        return 2
+
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    caller = RateLimitedCaller(RateLimiter(default_tps=args.tps), max_attempts=args.max_attempts)
+    preprocessor = None
+    if args.max_dimension:
+        preprocessor = ImagePreprocessor(args.max_dimension, args.jpeg_quality)
+    tester = RekognitionImageTester(
+        region_name=args.region,
+        concurrent=True,
+        max_workers=args.workers * 2,
+        operations=split_list(args.operations),
+        cache=cache,
+        output_dir=args.output_dir,
+        endpoint_url=args.endpoint_url,
+        rekognition_client=FakeRekognitionClient(latency=args.fake_latency) if args.fake else None,
+        caller=caller,
+        preprocessor=preprocessor,
+        renderer=args.renderer,
+        summary_template=args.summary_template,
+    )
+    callbacks = []
+    index = ResultIndex(args.index) if args.index else None
+    if index is not None:
+        callbacks.append(index.add_job)
+    checkpoint = CheckpointJournal(args.checkpoint) if args.checkpoint else None
+    if checkpoint is not None and len(checkpoint):
+        print(f"⏩ Resuming: {len(checkpoint)} images already done in {args.checkpoint}")
+    store = None
+    if args.store:
+        # Images only count as done once their rows are on disk
+        def mark_written(rows):
+            checkpoint.mark_done_many((row['source'] or row['image_id'], row['etag']) for row in rows)
+        store = ResultsStore(args.store, args.store_format, args.store_batch_size,
+                             mark_written if checkpoint is not None else None)
+    buffer_pool = BufferPool(int(args.download_budget * 1024 * 1024)) if args.download_budget else None
+    render_pool = None
+    if args.render_processes is not None:
+        render_pool = RenderPool(args.output_dir, processes=args.render_processes or None,
+                                 renderer=args.renderer, region_name=args.region,
+                                 summary_template=args.summary_template)
+    engine = BulkImageAnalyzer(
+        tester,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        outputs=split_list(args.outputs),
+        memmap_min_pixels=int(args.memmap_megapixels * 1e6) if args.memmap_megapixels else None,
+        render_pool=render_pool,
+        dashboard_every=args.dashboard_every,
+        on_result=combine_callbacks(callbacks + ([store.add_job] if store is not None else [])),
+        checkpoint=checkpoint,
+        mark_done=store is None,
+        buffer_pool=buffer_pool,
+    )
+
+    if args.metrics_file:
+        METRICS.start_periodic_export(args.metrics_file, args.metrics_interval)
+    plan = IncrementalPlan.from_store(args.store, args.store_format) if args.incremental else None
+    incremental = None
+    try:
+        report = engine.run(JobSource(args, plan, buffer_pool))
+        if plan is not None:
+            incremental = apply_incremental(plan, report, store, index)
+    finally:
+        tester.close()
+        if store is not None:
+            store.close()
+        if index is not None:
+            index.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if args.metrics_file:
+            METRICS.stop_periodic_export()
+            print(f"📈 Metrics written to {args.metrics_file}")
+
+    summary = {
+        'inputs': {'dir': args.dir, 'glob': args.glob, 's3': args.s3, 'manifest': args.manifest},
+        'operations': list(tester.operations),
+        'outputs': sorted(engine.outputs),
+        'workers': args.workers,
+        'preprocessing': preprocessor.params() if preprocessor is not None else None,
+        'report': report,
+        'cache': cache.stats() if cache is not None else None,
+        'calls': caller.stats(),
+        'store': {'path': store.path, 'format': store.format, 'rows': store.written} if store else None,
+        'incremental': incremental,
+        'download_buffers': buffer_pool.stats() if buffer_pool is not None else None,
+    }
+
+    if summary_stream is not None:
+        json.dump(summary, summary_stream, indent=2)
+        summary_stream.write('\n')
+    else:
+        path = args.summary_json or os.path.join(args.output_dir, 'batch_summary.json')
+        with atomic_write(path) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"📝 Summary written to {path}")
+
+    return 1 if report['failed'] else 0
+
+
+def main(argv=None):
+    """Entry point for the batch command"""
+    args = build_parser().parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'query':
+        return query(args)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
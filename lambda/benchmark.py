@@ -0,0 +1,274 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import boto3
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+
+from aws_clients import CALLER_RETRIES, make_config
+from fake_aws import FakeRekognitionClient, FakeRekognitionServer
+from images import RekognitionImageTester
+from raster_render import RasterRenderer
+from summary_plots import SummaryFigureTemplate
+
+# Stages measured for every case, in pipeline order
+STAGES = ('load_decode', 'api', 'visualize', 'raster', 'summary', 'summary_template', 'save')
+
+
+def make_test_image(width, height, quality=90, seed=0):
+    """Synthetic JPEG with gradients and noise, roughly as compressible as a photo"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 20, (height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def parse_sizes(value):
+    """Parse '640x480,1920x1080' into [(640, 480), (1920, 1080)]"""
+    sizes = []
+    for size in value.split(','):
+        width, _, height = size.strip().lower().partition('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds"""
+    values = [sample * 1000 for sample in samples]
+    return {
+        'runs': len(values),
+        'mean_ms': statistics.fmean(values),
+        'median_ms': statistics.median(values),
+        'min_ms': min(values),
+        'max_ms': max(values),
+        'stdev_ms': statistics.stdev(values) if len(values) > 1 else 0.0,
+    }
+
+
+def time_repeated(func, repeat, warmup=1):
+    """Run func warmup + repeat times, returning the timed durations in seconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class PipelineBenchmark:
+    """Measures each RekognitionImageTester stage against the offline Rekognition stand-in"""
+
+    def __init__(self, api_latency=0.05, repeat=5, use_http=False, output_dir=None):
+        self.api_latency = api_latency
+        self.repeat = repeat
+        self.use_http = use_http
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix='rekognition_bench_')
+        self.server = None
+
+    def _make_tester(self, detections):
+        """Tester whose Rekognition backend returns the requested number of detections"""
+        fake = FakeRekognitionClient(
+            latency=self.api_latency,
+            faces=(detections, detections),
+            labels=(detections, detections),
+        )
+        client = fake
+        if self.use_http:
+            self.server = FakeRekognitionServer(fake).start()
+            client = boto3.client(
+                'rekognition', region_name='us-east-1', endpoint_url=self.server.endpoint_url,
+                aws_access_key_id='bench', aws_secret_access_key='bench',
+                config=make_config(**CALLER_RETRIES),
+            )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            tester = RekognitionImageTester(rekognition_client=client, output_dir=self.output_dir)
+        # Render off-screen regardless of the environment
+        matplotlib.use('Agg', force=True)
+        tester.interactive_mode = False
+        return tester
+
+    def _stop_server(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+    def run_case(self, width, height, detections):
+        """Measure every stage for one image size and detection count"""
+        image_bytes = make_test_image(width, height)
+        tester = self._make_tester(detections)
+        quiet = io.StringIO()
+
+        def load_decode():
+            tester.decode_image(image_bytes)
+
+        def api():
+            tester.analyze_image(image_bytes)
+
+        try:
+            results = tester.analyze_image(image_bytes)
+            image = tester.decode_image(image_bytes)
+
+            def visualize():
+                fig = tester.build_detection_figure(image, results, 'bench')
+                fig.canvas.draw()
+                plt.close(fig)
+
+            raster_renderer = RasterRenderer()
+
+            def raster():
+                raster_renderer.render(image, results, 'bench')
+
+            def summary():
+                fig = tester.build_summary_figure(results, 'bench')
+                fig.canvas.draw()
+                plt.close(fig)
+
+            template = SummaryFigureTemplate()
+
+            def summary_template():
+                template.update(results, 'bench')
+                template.figure.canvas.draw()
+
+            detection_fig = tester.build_detection_figure(image, results, 'bench')
+
+            def save():
+                with contextlib.redirect_stdout(quiet):
+                    tester.save_plot(detection_fig, 'bench_detection_results')
+
+            stage_funcs = {
+                'load_decode': load_decode,
+                'api': api,
+                'visualize': visualize,
+                'raster': raster,
+                'summary': summary,
+                'summary_template': summary_template,
+                'save': save,
+            }
+            records = []
+            for stage in STAGES:
+                samples = time_repeated(stage_funcs[stage], self.repeat)
+                records.append({
+                    'stage': stage,
+                    'width': width,
+                    'height': height,
+                    'image_bytes': len(image_bytes),
+                    'detections': detections,
+                    **summarize(samples),
+                })
+            plt.close(detection_fig)
+            return records
+        finally:
+            tester.close()
+            self._stop_server()
+
+    def run(self, sizes, detection_counts):
+        """Run every case and return the full results document"""
+        records = []
+        for width, height in sizes:
+            for detections in detection_counts:
+                print(f"⏱️  {width}x{height}, {detections} detections...")
+                records.extend(self.run_case(width, height, detections))
+
+        return {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'matplotlib': matplotlib.__version__,
+                'numpy': np.__version__,
+                'api_latency_s': self.api_latency,
+                'transport': 'http' if self.use_http else 'in-process',
+                'repeat': self.repeat,
+            },
+            'results': records,
+        }
+
+
+def case_key(record):
+    return (record['stage'], record['width'], record['height'], record['detections'])
+
+
+def compare(current, baseline, threshold=0.10):
+    """Print median changes against a baseline run, returning the regressed cases"""
+    baseline_records = {case_key(record): record for record in baseline['results']}
+    regressions = []
+    print(f"\n{'stage':<12} {'size':>11} {'det':>4} {'base ms':>9} {'now ms':>9} {'change':>8}")
+    for record in current['results']:
+        old = baseline_records.get(case_key(record))
+        if old is None:
+            continue
+        change = record['median_ms'] / old['median_ms'] - 1 if old['median_ms'] else 0.0
+        flag = ' ⚠️' if change > threshold else ''
+        print(f"{record['stage']:<12} {record['width']:>5}x{record['height']:<5} {record['detections']:>4} "
+              f"{old['median_ms']:>9.1f} {record['median_ms']:>9.1f} {change:>+8.1%}{flag}")
+        if change > threshold:
+            regressions.append(record)
+    return regressions
+
+
+def print_results(document):
+    """Print a table of median stage latencies"""
+    print(f"\n{'stage':<12} {'size':>11} {'det':>4} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for record in document['results']:
+        print(f"{record['stage']:<12} {record['width']:>5}x{record['height']:<5} {record['detections']:>4} "
+              f"{record['median_ms']:>10.1f} {record['min_ms']:>8.1f} {record['max_ms']:>8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the image analysis pipeline offline')
+    parser.add_argument('--sizes', default='640x480,1920x1080,4000x3000',
+                        help='Comma separated WIDTHxHEIGHT image sizes')
+    parser.add_argument('--detections', default='0,5,20',
+                        help='Comma separated detection counts (faces and labels per image; '
+                             'labels are capped at the MaxLabels of 10)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per stage (default: 5)')
+    parser.add_argument('--api-latency', type=float, default=0.05,
+                        help='Seconds each stand-in Rekognition call takes (default: 0.05)')
+    parser.add_argument('--http', action='store_true',
+                        help='Call the stand-in through boto3 over loopback HTTP')
+    parser.add_argument('--output', help='Write the results JSON here')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Median slowdown treated as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    benchmark = PipelineBenchmark(api_latency=args.api_latency, repeat=args.repeat, use_http=args.http)
+    document = benchmark.run(parse_sizes(args.sizes), [int(n) for n in args.detections.split(',')])
+    print_results(document)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+        print(f"\n📝 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(document, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import threading
+
+from metrics import METRICS
+
+
+class BufferPool:
+    """
+    Reusable download buffers under a global memory budget
+
+    acquire(size) hands out a bytearray of exactly size bytes, reusing a free
+    buffer when one is large enough, and blocks while the buffers in use plus the
+    new one would exceed budget_bytes. Free buffers are dropped to make room
+    before anyone waits. A single object larger than the whole budget is still
+    allowed once nothing else is in use, so it can't deadlock.
+
+    Buffers are bytearrays rather than memoryviews because botocore accepts
+    bytearray image Bytes but rejects memoryview. Memory is accounted by buffer
+    length, which CPython may over-allocate by up to 2x after a buffer shrinks.
+    """
+
+    def __init__(self, budget_bytes, max_free=16):
+        self.budget_bytes = budget_bytes
+        self.max_free = max_free
+        self.condition = threading.Condition()
+        self.free = []
+        self.in_use = 0     # Bytes handed out
+        self.reserved = 0   # Bytes in handed out and free buffers
+        self.waits = 0
+        self.reuses = 0
+
+    def _drop_free(self, needed):
+        """Release free buffers (largest first) until needed more bytes fit the budget"""
+        self.free.sort(key=len)
+        while self.free and self.reserved + needed > self.budget_bytes:
+            self.reserved -= len(self.free.pop())
+
+    def acquire(self, size):
+        """Return a bytearray of length size, blocking until the budget allows it"""
+        with self.condition:
+            waited = False
+            while True:
+                # Smallest free buffer that is large enough
+                candidates = [buffer for buffer in self.free if len(buffer) >= size]
+                if candidates:
+                    buffer = min(candidates, key=len)
+                    self.free.remove(buffer)
+                    self.reserved -= len(buffer) - size
+                    del buffer[size:]
+                    self.reuses += 1
+                    break
+                self._drop_free(size)
+                if self.reserved + size <= self.budget_bytes or self.in_use == 0:
+                    buffer = bytearray(size)
+                    self.reserved += size
+                    break
+                waited = True
+                self.condition.wait()
+            self.in_use += size
+            if waited:
+                self.waits += 1
+                METRICS.increment('buffer_pool_waits_total')
+            return buffer
+
+    def release(self, buffer):
+        """Return a buffer from acquire() to the pool"""
+        with self.condition:
+            self.in_use -= len(buffer)
+            # Buffers let past the budget (an oversized object) aren't kept
+            if len(self.free) < self.max_free and self.reserved <= self.budget_bytes:
+                self.free.append(buffer)
+            else:
+                self.reserved -= len(buffer)
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'budget_bytes': self.budget_bytes,
+                'in_use_bytes': self.in_use,
+                'reserved_bytes': self.reserved,
+                'free_buffers': len(self.free),
+                'waits': self.waits,
+                'reuses': self.reuses,
+            }
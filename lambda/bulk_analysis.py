@@ -0,0 +1,380 @@
+import os
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import METRICS
+from s3_utils import download_object, download_object_into
+from summary_plots import SummaryAggregator
+
+# A unit of bulk work: a display name, a callable returning the image bytes and,
+# optionally, an S3Object reference Rekognition can read the image from directly,
+# the object's ETag, a picklable source (('file', path) or ('s3', bucket, key))
+# render processes can load the image from and the object's LastModified time
+ImageJob = namedtuple('ImageJob', ['name', 'fetch', 's3_object', 'etag', 'source', 'last_modified'],
+                      defaults=(None, None, None, None))
+
+# Files the bulk engine can write for each image
+OUTPUTS = ('detections', 'summary', 'json', 'dashboard')
+
+# File the 'dashboard' output writes in the tester's output directory
+DASHBOARD_FILENAME = 'summary_dashboard.png'
+
+
+@METRICS.timed('download', source='file')
+def read_file(path):
+    """Read a local file's bytes"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def local_job(path):
+    """Job for an image file on disk"""
+    return ImageJob(path, lambda: read_file(path), source=('file', path))
+
+
+def s3_job(s3, bucket_name, key, etag=None, use_s3_object=False, last_modified=None, buffer_pool=None,
+           size=None):
+    """Job for an S3 object, optionally analyzed through an S3Object reference
+
+    With a BufferPool the object is streamed into one of its buffers, which the
+    bulk engine releases once the image is done; size is the listed object size.
+    """
+    s3_object = {'Bucket': bucket_name, 'Name': key} if use_s3_object else None
+    if buffer_pool is not None:
+        fetch = lambda: download_object_into(s3, bucket_name, key, buffer_pool, size)
+    else:
+        fetch = lambda: download_object(s3, bucket_name, key)
+    return ImageJob(
+        key,
+        fetch,
+        s3_object,
+        etag,
+        ('s3', bucket_name, key),
+        last_modified,
+    )
+
+
+def job_location(job):
+    """Where a job's image lives: a local path or an s3:// URI (None if unknown)"""
+    if job.source is None:
+        return None
+    if job.source[0] == 's3':
+        return f's3://{job.source[1]}/{job.source[2]}'
+    return job.source[1]
+
+
+def job_key(job):
+    """Key identifying a job across runs (checkpoints, incremental runs)"""
+    return job_location(job) or job.name
+
+
+class StageStats:
+    """Thread-safe latency samples for each pipeline stage"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Record one latency sample (in seconds) for a stage"""
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def summary(self, points=(50, 90, 99)):
+        """Return count, mean and latency percentiles (in ms) per stage"""
+        with self.lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+
+        summary = {}
+        for stage, values in samples.items():
+            values_ms = np.array(values) * 1000
+            stage_summary = {'count': len(values), 'mean_ms': float(values_ms.mean())}
+            for point, value in zip(points, np.percentile(values_ms, points)):
+                stage_summary[f'p{point}_ms'] = float(value)
+            summary[stage] = stage_summary
+        return summary
+
+
+class BulkImageAnalyzer:
+    """Non-interactive engine that downloads, analyzes and renders many images in parallel"""
+
+    STAGES = ('download', 'decode', 'analyze', 'render', 'render_wait', 'save')
+
+    def __init__(self, tester, workers=8, max_in_flight=None, outputs=('detections', 'summary'),
+                 memmap_min_pixels=None, render_pool=None, dashboard_every=None, on_result=None,
+                 checkpoint=None, mark_done=True, buffer_pool=None):
+        """
+        tester: RekognitionImageTester used for analysis and visualization
+        workers: number of worker threads processing images
+        max_in_flight: maximum number of submitted but unfinished images (default 2 x workers)
+        outputs: files to write per image, any of 'detections' (bounding box plot),
+            'summary' (statistics plot) and 'json' (raw results), plus
+            'dashboard' for one summary of the whole run instead of per image
+        memmap_min_pixels: decode images with at least this many pixels into
+            memory-mapped temporary files instead of process memory
+        render_pool: optional RenderPool; visualizations are then rendered in its
+            worker processes instead of on the worker threads
+        dashboard_every: also save a dashboard snapshot every this many images
+        on_result: called as on_result(job, results) for every successfully
+            analyzed image, from the worker threads (e.g. ResultsStore.add_job)
+        checkpoint: optional CheckpointJournal; jobs it lists as done are skipped
+            and, with mark_done, jobs are recorded once their outputs are written
+            (pass mark_done=False when something else records them, such as a
+            ResultsStore once their rows are on disk)
+        buffer_pool: the BufferPool jobs download into (see s3_job); each image's
+            buffer is released when the image is done
+        """
+        unknown = [output for output in outputs if output not in OUTPUTS]
+        if unknown:
+            raise ValueError(f"Unknown outputs: {', '.join(unknown)}")
+        self.tester = tester
+        self.workers = workers
+        self.max_in_flight = max_in_flight or workers * 2
+        self.outputs = set(outputs)
+        # Image bytes are only needed to draw bounding boxes
+        self.render = 'detections' in self.outputs
+        self.memmap_min_pixels = memmap_min_pixels
+        self.render_pool = render_pool
+        self.aggregator = SummaryAggregator() if 'dashboard' in self.outputs else None
+        self.dashboard_every = dashboard_every
+        self.dashboard_path = os.path.join(tester.output_dir, DASHBOARD_FILENAME)
+        self.on_result = on_result
+        self.checkpoint = checkpoint
+        self.mark_done = mark_done
+        self.buffer_pool = buffer_pool
+        self.skipped = 0
+        # pyplot keeps global state, so figures are built one at a time
+        self.render_lock = threading.Lock()
+        # Seconds the current thread's render spent waiting for render_lock
+        self.render_waits = threading.local()
+        self.stats = StageStats()
+        self.failures = []
+        self.processed = 0
+        self.counter_lock = threading.Lock()
+
+    def _timed(self, stage, func, *args, **kwargs):
+        """Run func, recording its duration under the given stage"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.stats.record(stage, time.perf_counter() - start)
+
+    def _timed_render(self, func, *args):
+        """Run func, recording its duration under render without its waits for render_lock"""
+        self.render_waits.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.stats.record('render', time.perf_counter() - start - self.render_waits.seconds)
+
+    @contextmanager
+    def _render_locked(self):
+        """Hold render_lock, recording the time spent waiting for it under render_wait"""
+        start = time.perf_counter()
+        with self.render_lock:
+            waited = time.perf_counter() - start
+            self.stats.record('render_wait', waited)
+            self.render_waits.seconds = getattr(self.render_waits, 'seconds', 0.0) + waited
+            yield
+
+    def _render(self, image_bytes, pixels, results, name):
+        """Render visualizations for one image, serializing pyplot use across workers"""
+        if self.render and self.tester.raster_renderer is not None:
+            # OpenCV drawing has no global state, so workers render in parallel
+            self.tester.save_raster(pixels, results, name)
+            if 'summary' in self.outputs:
+                with self._render_locked():
+                    self.tester.create_summary_plot(results, name, show=False)
+            return
+
+        with self._render_locked():
+            if self.render:
+                self.tester.visualize_results(image_bytes, results, name, show=False,
+                                              summary='summary' in self.outputs, pixels=pixels)
+            else:
+                self.tester.create_summary_plot(results, name, show=False)
+
+    @staticmethod
+    def _render_source(job, image_bytes):
+        """What a render process loads an image from
+
+        Downloaded bytes are sent along (copied out of pooled buffers, which are
+        reused before the pool pickles them); local files and objects that were
+        never downloaded are loaded by the render process itself.
+        """
+        if job.source is not None and (image_bytes is None or job.source[0] == 'file'):
+            return job.source
+        return bytes(image_bytes) if isinstance(image_bytes, bytearray) else image_bytes
+
+    def _submit_render(self, source, results, job):
+        """Queue an image on the render pool, counting it as failed if rendering fails"""
+        def done(future):
+            error = future.exception()
+            if error is not None:
+                with self.counter_lock:
+                    self.processed -= 1
+                    self.failures.append({'name': job.name, 'source': job_location(job),
+                                          'stage': 'render', 'error': str(error)})
+            elif self.checkpoint is not None and self.mark_done:
+                self.checkpoint.mark_done(job_key(job), job.etag)
+
+        outputs = [output for output in ('detections', 'summary') if output in self.outputs]
+        self.render_pool.submit(source, results, job.name, outputs, on_done=done)
+
+    def process(self, job):
+        """Run every stage for a single job, recording failures instead of raising"""
+        stage = 'download'
+        image_bytes = None
+        try:
+            pixels = None
+            rendering = False  # Still rendering in the pool when process returns
+            if job.s3_object is None:
+                image_bytes = self._timed(stage, job.fetch)
+                if self.render and self.render_pool is None and self.tester.preprocessor is not None:
+                    # Decode once for both the preprocessor and the renderer
+                    stage = 'decode'
+                    pixels = self._timed(stage, self.tester.decode_image, image_bytes,
+                                         self.memmap_min_pixels)
+
+            stage = 'analyze'
+            if job.s3_object is not None:
+                # Rekognition reads the object itself; bytes are only needed to render
+                results = self._timed(stage, self.tester.analyze_image,
+                                      s3_object=job.s3_object, etag=job.etag)
+            else:
+                results = self._timed(stage, self.tester.analyze_image, image_bytes, pixels=pixels)
+
+            if results.get('errors'):
+                # Don't write outputs that would record failed calls as empty detections
+                raise RuntimeError('; '.join(f'{name}: {error}' for name, error in results['errors'].items()))
+
+            if self.render_pool is not None:
+                if self.render and image_bytes is None and job.source is None:
+                    stage = 'download'
+                    image_bytes = self._timed(stage, job.fetch)
+                if self.render or 'summary' in self.outputs:
+                    stage = 'render'
+                    self._timed(stage, self._submit_render, self._render_source(job, image_bytes),
+                                results, job)
+                    rendering = True
+            else:
+                if self.render and image_bytes is None:
+                    stage = 'download'
+                    image_bytes = self._timed(stage, job.fetch)
+
+                if self.render and pixels is None:
+                    stage = 'decode'
+                    pixels = self._timed(stage, self.tester.decode_image, image_bytes,
+                                         self.memmap_min_pixels)
+
+                if self.render or 'summary' in self.outputs:
+                    stage = 'render'
+                    self._timed_render(self._render, image_bytes, pixels, results, job.name)
+
+            if 'json' in self.outputs:
+                stage = 'save'
+                self._timed(stage, self.tester.save_results, results, job.name)
+
+            if self.on_result is not None:
+                stage = 'save'
+                self._timed(stage, self.on_result, job, results)
+
+            if self.aggregator is not None:
+                stage = 'aggregate'
+                count = self.aggregator.add(results)
+                if self.dashboard_every and count % self.dashboard_every == 0:
+                    self._timed_render(self.save_dashboard)
+
+            if self.checkpoint is not None and self.mark_done and not rendering:
+                self.checkpoint.mark_done(job_key(job), job.etag)
+
+            with self.counter_lock:
+                self.processed += 1
+            return results
+        except Exception as e:
+            with self.counter_lock:
+                self.failures.append({'name': job.name, 'source': job_location(job),
+                                      'stage': stage, 'error': str(e)})
+            return None
+        finally:
+            if self.buffer_pool is not None and isinstance(image_bytes, bytearray):
+                self.buffer_pool.release(image_bytes)
+
+    def save_dashboard(self):
+        """Write the run dashboard with everything aggregated so far"""
+        with self._render_locked():
+            self.aggregator.save(self.dashboard_path)
+
+    def run(self, jobs):
+        """Process every job from an iterable and return a report dict"""
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        start = time.perf_counter()
+
+        def release(_future):
+            in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for job in jobs:
+                if self.checkpoint is not None and self.checkpoint.is_done(job_key(job), job.etag):
+                    self.skipped += 1
+                    continue
+                # Block the producer while the in-flight queue is full
+                in_flight.acquire()
+                future = pool.submit(self.process, job)
+                future.add_done_callback(release)
+
+        if self.render_pool is not None:
+            # Wait for the last renders so their failures are in the report
+            self.render_pool.close()
+
+        if self.aggregator is not None:
+            self._timed_render(self.save_dashboard)
+
+        elapsed = time.perf_counter() - start
+        report = {
+            'processed': self.processed,
+            'failed': len(self.failures),
+            'skipped': self.skipped,
+            'elapsed_s': elapsed,
+            'images_per_s': self.processed / elapsed if elapsed > 0 else 0.0,
+            'stages': self.stats.summary(),
+            'failures': list(self.failures),
+        }
+        if self.aggregator is not None:
+            report['dashboard'] = {'path': self.dashboard_path, **self.aggregator.to_dict()}
+        self.print_report(report)
+        return report
+
+    def print_report(self, report):
+        """Print a human readable summary of a bulk run"""
+        print(f"\n{'='*50}")
+        print("📈 Bulk Analysis Report")
+        print(f"{'='*50}")
+        print(f"Processed: {report['processed']}  Failed: {report['failed']}  "
+              f"Skipped (checkpoint): {report['skipped']}")
+        print(f"Elapsed: {report['elapsed_s']:.1f}s  Throughput: {report['images_per_s']:.2f} images/s")
+        if 'dashboard' in report:
+            print(f"Dashboard: {report['dashboard']['path']}")
+
+        for stage in self.STAGES:
+            stage_summary = report['stages'].get(stage)
+            if not stage_summary:
+                continue
+            print(f"  {stage:<11} n={stage_summary['count']:<6} "
+                  f"p50={stage_summary['p50_ms']:.0f}ms "
+                  f"p90={stage_summary['p90_ms']:.0f}ms "
+                  f"p99={stage_summary['p99_ms']:.0f}ms")
+
+        if report['failures']:
+            print(f"\n❌ Failures ({len(report['failures'])}):")
+            for failure in report['failures'][:20]:
+                print(f"  {failure['name']} [{failure['stage']}]: {failure['error']}")
+            if len(report['failures']) > 20:
+                print(f"  ... and {len(report['failures']) - 20} more")
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Yield a temporary path to write instead of path, moved over path on success
+
+    The temporary file sits next to path and keeps its extension (so libraries
+    that pick a format from the name still work). Readers and resumed runs see
+    either the old file or the complete new one, never a partial write.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp_path = f'{root}.tmp-{os.getpid()}-{threading.get_ident()}{ext}'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of images whose outputs are complete
+
+    Each completed image is appended as one JSON line holding its key and ETag,
+    and flushed immediately, so after a crash a restarted run can skip everything
+    already done. A key only counts as done for the same ETag (when both are
+    known), so objects changed since the checkpoint are analyzed again. A partial
+    last line from an interrupted write is ignored. Thread-safe.
+    """
+
+    def __init__(self, path, fsync=False):
+        """fsync: also force every entry to disk, surviving power loss as well as crashes"""
+        self.path = path
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.done = {}
+        self._load()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.journal = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.done[entry['key']] = entry.get('etag')
+
+    def __len__(self):
+        return len(self.done)
+
+    def is_done(self, key, etag=None):
+        """Whether key was completed (with the same ETag, if both are known)"""
+        with self.lock:
+            if key not in self.done:
+                return False
+            done_etag = self.done[key]
+            return etag is None or done_etag is None or done_etag == etag
+
+    def mark_done(self, key, etag=None):
+        self.mark_done_many([(key, etag)])
+
+    def mark_done_many(self, entries):
+        """Record (key, etag) pairs as completed"""
+        with self.lock:
+            for key, etag in entries:
+                self.done[key] = etag
+                self.journal.write(json.dumps({'key': key, 'etag': etag}) + '\n')
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+
+    def close(self):
+        with self.lock:
+            if not self.journal.closed:
+                self.journal.close()
@@ -0,0 +1,409 @@
+"""
+Offline stand-ins for the Rekognition and S3 clients
+
+FakeRekognitionClient and FakeS3Client implement the subset of the boto3 client
+methods the analyzers use, returning realistic payloads without network access
+or API spend. FakeRekognitionServer serves a FakeRekognitionClient over loopback
+HTTP using Rekognition's JSON protocol, so a real boto3 client pointed at its
+endpoint_url exercises the full botocore request path.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+EMOTIONS = ['HAPPY', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED', 'SURPRISED', 'CALM', 'FEAR']
+
+LANDMARKS = [
+    'eyeLeft', 'eyeRight', 'nose', 'mouthLeft', 'mouthRight', 'leftEyeBrowLeft',
+    'leftEyeBrowRight', 'leftEyeBrowUp', 'rightEyeBrowLeft', 'rightEyeBrowRight',
+    'rightEyeBrowUp', 'leftEyeLeft', 'leftEyeRight', 'leftEyeUp', 'leftEyeDown',
+    'rightEyeLeft', 'rightEyeRight', 'rightEyeUp', 'rightEyeDown', 'noseLeft',
+    'noseRight', 'mouthUp', 'mouthDown', 'leftPupil', 'rightPupil', 'upperJawlineLeft',
+    'midJawlineLeft', 'chinBottom', 'midJawlineRight', 'upperJawlineRight',
+]
+
+# (name, parent categories, whether instances with bounding boxes are returned)
+LABELS = [
+    ('Person', [], True), ('Human', [], False), ('Car', ['Vehicle', 'Transportation'], True),
+    ('Vehicle', ['Transportation'], False), ('Dog', ['Animal', 'Pet'], True),
+    ('Cat', ['Animal', 'Pet'], True), ('Chair', ['Furniture'], True),
+    ('Furniture', [], False), ('Laptop', ['Computer', 'Electronics'], True),
+    ('Computer', ['Electronics'], False), ('Building', ['Architecture'], False),
+    ('Tree', ['Plant'], True), ('Plant', [], False), ('Outdoors', [], False),
+    ('Indoors', [], False), ('Face', ['Person'], False), ('Sunglasses', ['Accessories'], True),
+    ('Bottle', [], True), ('Table', ['Furniture'], True), ('Office', ['Indoors'], False),
+]
+
+
+def client_error(code, message, operation, status=400):
+    """Build a ClientError shaped like the ones botocore raises"""
+    return ClientError(
+        {'Error': {'Code': code, 'Message': message},
+         'ResponseMetadata': {'HTTPStatusCode': status}},
+        operation,
+    )
+
+
+def _box(rng, min_size=0.05, max_size=0.4):
+    width = rng.uniform(min_size, max_size)
+    height = rng.uniform(min_size, max_size)
+    return {
+        'Width': width,
+        'Height': height,
+        'Left': rng.uniform(0, 1 - width),
+        'Top': rng.uniform(0, 1 - height),
+    }
+
+
+def _flag(rng):
+    return {'Value': rng.random() < 0.3, 'Confidence': rng.uniform(80, 99.9)}
+
+
+class FakeRekognitionClient:
+    """
+    In-process Rekognition stand-in with configurable latency, throttling and payloads
+
+    Detections are generated deterministically from the image content (or S3
+    location), so the same image always gets the same results.
+
+    latency, jitter: seconds each call sleeps, plus uniform random extra up to jitter
+    throttle_rate: probability that a call fails with ThrottlingException
+    max_tps: calls per second above which calls fail with ThrottlingException
+    faces, labels: (min, max) number of faces and labels returned per image
+    instances: maximum bounding box instances per label that has them
+    s3: optional FakeS3Client used to validate S3Object references
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, throttle_rate=0.0, max_tps=None,
+                 faces=(0, 3), labels=(5, 10), instances=3, s3=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.max_tps = max_tps
+        self.faces = faces
+        self.labels = labels
+        self.instances = instances
+        self.s3 = s3
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.throttled = 0
+        self.recent_calls = []
+
+    def _image_seed(self, image, operation):
+        """Seed derived from the image so payloads are stable across calls"""
+        if 'Bytes' in image:
+            data = bytes(image['Bytes'])
+            if not data:
+                raise client_error('InvalidImageFormatException', 'Request has invalid image format', operation)
+            if len(data) > 5 * 1024 * 1024:
+                raise client_error('ImageTooLargeException', 'Image size is too large', operation)
+            return hashlib.sha256(data).hexdigest()
+
+        s3_object = image.get('S3Object')
+        if not s3_object:
+            raise client_error('InvalidParameterException', 'Request has invalid parameters', operation)
+        if self.s3 is not None and not self.s3.has_object(s3_object['Bucket'], s3_object['Name']):
+            raise client_error('InvalidS3ObjectException', 'Unable to get object metadata from S3', operation)
+        return hashlib.sha256(f"{s3_object['Bucket']}/{s3_object['Name']}".encode()).hexdigest()
+
+    def _call(self, operation, image, build):
+        """Apply latency and throttling, then build the response"""
+        now = time.time()
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            throttled = self.rng.random() < self.throttle_rate
+            if self.max_tps is not None:
+                self.recent_calls = [t for t in self.recent_calls if now - t < 1.0]
+                if len(self.recent_calls) >= self.max_tps:
+                    throttled = True
+                else:
+                    self.recent_calls.append(now)
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if throttled:
+                self.throttled += 1
+
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            raise client_error('ThrottlingException', 'Rate exceeded', operation)
+
+        rng = random.Random(self._image_seed(image, operation) + operation)
+        return build(rng)
+
+    def _face(self, rng):
+        low = rng.randint(1, 70)
+        emotions = [{'Type': emotion, 'Confidence': rng.uniform(0, 100)} for emotion in EMOTIONS]
+        emotions.sort(key=lambda emotion: emotion['Confidence'], reverse=True)
+        box = _box(rng, 0.1, 0.35)
+        return {
+            'BoundingBox': box,
+            'AgeRange': {'Low': low, 'High': low + rng.randint(3, 12)},
+            'Smile': _flag(rng),
+            'Eyeglasses': _flag(rng),
+            'Sunglasses': _flag(rng),
+            'Gender': {'Value': rng.choice(['Male', 'Female']), 'Confidence': rng.uniform(80, 99.9)},
+            'Beard': _flag(rng),
+            'Mustache': _flag(rng),
+            'EyesOpen': _flag(rng),
+            'MouthOpen': _flag(rng),
+            'Emotions': emotions,
+            'Landmarks': [
+                {'Type': name,
+                 'X': box['Left'] + rng.uniform(0, box['Width']),
+                 'Y': box['Top'] + rng.uniform(0, box['Height'])}
+                for name in LANDMARKS
+            ],
+            'Pose': {'Roll': rng.uniform(-30, 30), 'Yaw': rng.uniform(-45, 45), 'Pitch': rng.uniform(-30, 30)},
+            'Quality': {'Brightness': rng.uniform(30, 90), 'Sharpness': rng.uniform(20, 95)},
+            'Confidence': rng.uniform(90, 99.99),
+            'FaceOccluded': _flag(rng),
+            'EyeDirection': {'Yaw': rng.uniform(-20, 20), 'Pitch': rng.uniform(-20, 20),
+                             'Confidence': rng.uniform(80, 99.9)},
+        }
+
+    def _label(self, rng, name, parents, has_instances):
+        confidence = rng.uniform(70, 99.9)
+        instances = []
+        if has_instances:
+            instances = [{'BoundingBox': _box(rng), 'Confidence': rng.uniform(70, confidence)}
+                         for _ in range(rng.randint(1, self.instances))]
+        return {
+            'Name': name,
+            'Confidence': confidence,
+            'Instances': instances,
+            'Parents': [{'Name': parent} for parent in parents],
+            'Aliases': [],
+            'Categories': [{'Name': 'General'}],
+        }
+
+    def detect_faces(self, Image, Attributes=None):
+        def build(rng):
+            count = rng.randint(*self.faces)
+            return {'FaceDetails': [self._face(rng) for _ in range(count)]}
+        return self._call('DetectFaces', Image, build)
+
+    def detect_labels(self, Image, MaxLabels=None, MinConfidence=None, **kwargs):
+        def build(rng):
+            count = min(rng.randint(*self.labels), MaxLabels or len(LABELS), len(LABELS))
+            labels = [self._label(rng, *label) for label in rng.sample(LABELS, count)]
+            labels = [label for label in labels if label['Confidence'] >= (MinConfidence or 0)]
+            labels.sort(key=lambda label: label['Confidence'], reverse=True)
+            return {'Labels': labels, 'LabelModelVersion': '3.0'}
+        return self._call('DetectLabels', Image, build)
+
+    def detect_text(self, Image, **kwargs):
+        def build(rng):
+            words = [rng.choice(['EXIT', 'OPEN', 'SALE', 'STOP', 'CAFE']) for _ in range(rng.randint(0, 3))]
+            return {'TextDetections': [
+                {'DetectedText': word, 'Type': 'WORD', 'Id': i, 'Confidence': rng.uniform(80, 99.9),
+                 'Geometry': {'BoundingBox': _box(rng, 0.02, 0.2)}}
+                for i, word in enumerate(words)
+            ]}
+        return self._call('DetectText', Image, build)
+
+    def detect_moderation_labels(self, Image, MinConfidence=None, **kwargs):
+        return self._call('DetectModerationLabels', Image, lambda rng: {'ModerationLabels': []})
+
+
+class FakeS3Client:
+    """
+    In-memory S3 stand-in supporting listing, downloads and uploads
+
+    objects: optional {bucket: {key: bytes}} to start with
+    latency: seconds each call sleeps
+    """
+
+    def __init__(self, objects=None, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.buckets = {}
+        for bucket, contents in (objects or {}).items():
+            for key, body in contents.items():
+                self.put_object(Bucket=bucket, Key=key, Body=body)
+
+    @classmethod
+    def from_directory(cls, bucket_name, directory, **kwargs):
+        """Create a client whose bucket holds every file under a local directory"""
+        client = cls(**kwargs)
+        for root, _dirs, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                key = os.path.relpath(path, directory).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    client.put_object(Bucket=bucket_name, Key=key, Body=f.read())
+        return client
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def has_object(self, bucket_name, key):
+        with self.lock:
+            return key in self.buckets.get(bucket_name, {})
+
+    def _get(self, Bucket, Key, operation):
+        with self.lock:
+            if Bucket not in self.buckets:
+                raise client_error('NoSuchBucket', 'The specified bucket does not exist', operation, 404)
+            obj = self.buckets[Bucket].get(Key)
+        if obj is None:
+            raise client_error('NoSuchKey', 'The specified key does not exist.', operation, 404)
+        return obj
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        body = Body.encode() if isinstance(Body, str) else bytes(Body)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        with self.lock:
+            self.buckets.setdefault(Bucket, {})[Key] = {
+                'Body': body,
+                'ETag': etag,
+                'LastModified': datetime.now(timezone.utc),
+            }
+        return {'ETag': etag}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.buckets.get(Bucket, {}).pop(Key, None)
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._sleep()
+        obj = self._get(Bucket, Key, 'HeadObject')
+        return {'ContentLength': len(obj['Body']), 'ETag': obj['ETag'], 'LastModified': obj['LastModified']}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._sleep()
+        obj = self._get(Bucket, Key, 'GetObject')
+        return {
+            'Body': StreamingBody(io.BytesIO(obj['Body']), len(obj['Body'])),
+            'ContentLength': len(obj['Body']),
+            'ETag': obj['ETag'],
+            'LastModified': obj['LastModified'],
+        }
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, StartAfter=None, ContinuationToken=None, **kwargs):
+        self._sleep()
+        with self.lock:
+            if Bucket not in self.buckets:
+                raise client_error('NoSuchBucket', 'The specified bucket does not exist', 'ListObjectsV2', 404)
+            keys = sorted(key for key in self.buckets[Bucket] if key.startswith(Prefix or ''))
+            objects = self.buckets[Bucket]
+
+            # Continuation tokens are simply the last key of the previous page
+            after = ContinuationToken or StartAfter
+            if after:
+                keys = [key for key in keys if key > after]
+            page, remaining = keys[:MaxKeys], keys[MaxKeys:]
+
+            response = {
+                'Name': Bucket,
+                'Prefix': Prefix or '',
+                'MaxKeys': MaxKeys,
+                'KeyCount': len(page),
+                'IsTruncated': bool(remaining),
+            }
+            if page:
+                response['Contents'] = [
+                    {'Key': key, 'Size': len(objects[key]['Body']), 'ETag': objects[key]['ETag'],
+                     'LastModified': objects[key]['LastModified'], 'StorageClass': 'STANDARD'}
+                    for key in page
+                ]
+            if remaining:
+                response['NextContinuationToken'] = page[-1]
+            return response
+
+
+class _RekognitionRequestHandler(BaseHTTPRequestHandler):
+    """Serves Rekognition's JSON protocol (X-Amz-Target: RekognitionService.<Operation>)"""
+
+    # Operation name -> FakeRekognitionClient method
+    OPERATIONS = {
+        'DetectFaces': 'detect_faces',
+        'DetectLabels': 'detect_labels',
+        'DetectText': 'detect_text',
+        'DetectModerationLabels': 'detect_moderation_labels',
+    }
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-amzn-RequestId', hashlib.md5(body).hexdigest())
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        operation = self.headers.get('X-Amz-Target', '').rpartition('.')[2]
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        method_name = self.OPERATIONS.get(operation)
+        if method_name is None:
+            self._send_json(400, {'__type': 'UnknownOperationException', 'message': operation})
+            return
+
+        image = request.pop('Image', {})
+        if 'Bytes' in image:
+            image['Bytes'] = base64.b64decode(image['Bytes'])
+
+        try:
+            response = getattr(self.server.client, method_name)(Image=image, **request)
+        except ClientError as e:
+            error = e.response['Error']
+            self._send_json(e.response['ResponseMetadata']['HTTPStatusCode'],
+                            {'__type': error['Code'], 'message': error['Message']})
+            return
+        self._send_json(200, response)
+
+
+class FakeRekognitionServer:
+    """
+    Loopback HTTP endpoint backed by a FakeRekognitionClient
+
+    Use as a context manager and point boto3 at endpoint_url:
+        with FakeRekognitionServer(FakeRekognitionClient()) as server:
+            client = boto3.client('rekognition', endpoint_url=server.endpoint_url, ...)
+    """
+
+    def __init__(self, client=None, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _RekognitionRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.client = client or FakeRekognitionClient()
+        self.thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-rekognition', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,222 @@
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Size frames are reduced to before comparing them
+SAMPLE_SIZE = (64, 36)
+
+
+def downscale_gray(frame, size=SAMPLE_SIZE):
+    """
+    Reduce a BGR frame to a small grayscale image for cheap comparisons
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def frame_difference(previous, current):
+    """
+    Mean absolute pixel difference between two downscaled frames, from 0 to 1
+    """
+    return float(np.mean(cv2.absdiff(previous, current))) / 255.0
+
+
+class SamplingScheduler(ABC):
+    """
+    Decides which video frames are sent to Rekognition
+
+    The capture loop calls observe_frame for every frame, should_analyze to ask
+    whether the current frame should be analyzed, mark_analyzed when a frame is
+    sent and record_latency when its analysis finishes.
+    """
+
+    def __init__(self, rate_window=10.0):
+        self.rate_window = rate_window
+        self.analysis_times = deque()
+
+    def observe_frame(self, frame):
+        """
+        Look at a captured frame (used by schedulers that track scene activity)
+        """
+
+    @abstractmethod
+    def should_analyze(self, frame_count, now, force=False):
+        """
+        Whether the current frame should be analyzed (force: requested manually)
+        """
+
+    def mark_analyzed(self, now):
+        """
+        Record that a frame was sent for analysis
+        """
+        self.analysis_times.append(now)
+
+    def mark_skipped(self, now):
+        """
+        Record that a scheduled frame was skipped without calling the API
+        """
+
+    def record_latency(self, seconds):
+        """
+        Record how long an analysis took
+        """
+
+    def current_rate(self, now=None):
+        """
+        Analyses per second over the last rate_window seconds
+        """
+        now = time.time() if now is None else now
+        while self.analysis_times and now - self.analysis_times[0] > self.rate_window:
+            self.analysis_times.popleft()
+        return len(self.analysis_times) / self.rate_window
+
+    def metrics(self, now=None):
+        """
+        Current scheduler state, reported as gauges by run_video_analysis
+        """
+        return {'current_rate': self.current_rate(now)}
+
+
+class FixedIntervalScheduler(SamplingScheduler):
+    """
+    Analyze every N frames, but no more than once per min_interval seconds
+    """
+
+    def __init__(self, every_n_frames=30, min_interval=2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.every_n_frames = every_n_frames
+        self.min_interval = min_interval
+        self.last_analysis_time = time.time()
+
+    def should_analyze(self, frame_count, now, force=False):
+        wanted = force or frame_count % self.every_n_frames == 0
+        return wanted and now - self.last_analysis_time > self.min_interval
+
+    def mark_analyzed(self, now):
+        super().mark_analyzed(now)
+        self.last_analysis_time = now
+
+    def mark_skipped(self, now):
+        self.last_analysis_time = now
+
+
+class AdaptiveScheduler(SamplingScheduler):
+    """
+    Adapt the analysis rate to API latency, a call budget and scene activity
+
+    The interval between analyses never drops below what the per-second call
+    budget allows (calls_per_analysis Rekognition calls per frame) or below the
+    smoothed API latency. On top of that floor the interval stretches by up to
+    idle_factor while the scene is static, and shrinks back as activity rises.
+    """
+
+    def __init__(self, max_calls_per_second=1.0, calls_per_analysis=2, min_interval=0.5,
+                 max_interval=10.0, idle_factor=4.0, active_difference=0.05,
+                 smoothing=0.3, **kwargs):
+        super().__init__(**kwargs)
+        self.max_calls_per_second = max_calls_per_second
+        self.calls_per_analysis = calls_per_analysis
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_factor = idle_factor
+        # Frame difference treated as full activity
+        self.active_difference = active_difference
+        self.smoothing = smoothing
+        self.latency = 0.0
+        self.activity = 1.0
+        self.previous_small = None
+        self.last_analysis_time = 0.0
+
+    def observe_frame(self, frame):
+        small = downscale_gray(frame)
+        if self.previous_small is not None:
+            activity = min(1.0, frame_difference(self.previous_small, small) / self.active_difference)
+            self.activity += self.smoothing * (activity - self.activity)
+        self.previous_small = small
+
+    def record_latency(self, seconds):
+        self.latency += self.smoothing * (seconds - self.latency)
+
+    def interval(self):
+        """
+        Current target seconds between analyses
+        """
+        budget_interval = self.calls_per_analysis / self.max_calls_per_second
+        floor = max(self.min_interval, budget_interval, self.latency)
+        stretch = 1.0 + (1.0 - self.activity) * (self.idle_factor - 1.0)
+        return min(max(floor * stretch, floor), max(self.max_interval, floor))
+
+    def should_analyze(self, frame_count, now, force=False):
+        elapsed = now - self.last_analysis_time
+        if force:
+            # Manual requests skip the activity stretch but still respect the budget
+            return elapsed >= self.calls_per_analysis / self.max_calls_per_second
+        return elapsed >= self.interval()
+
+    def mark_analyzed(self, now):
+        super().mark_analyzed(now)
+        self.last_analysis_time = now
+
+    def mark_skipped(self, now):
+        self.last_analysis_time = now
+
+    def metrics(self, now=None):
+        metrics = super().metrics(now)
+        metrics.update({
+            'target_rate': 1.0 / self.interval(),
+            'latency': self.latency,
+            'activity': self.activity,
+        })
+        return metrics
+
+
+class SceneChangeGate:
+    """
+    Cheap local check that skips Rekognition calls for unchanged scenes
+
+    Each candidate frame is downscaled and compared with the last frame that was
+    actually analyzed, by mean absolute pixel difference and by grayscale
+    histogram correlation. The frame counts as changed if either comparison
+    crosses its threshold.
+    """
+
+    def __init__(self, pixel_threshold=0.03, histogram_threshold=0.98, bins=32):
+        self.pixel_threshold = pixel_threshold
+        self.histogram_threshold = histogram_threshold
+        self.bins = bins
+        self.reference_small = None
+        self.reference_hist = None
+        self.checked = 0
+        self.skipped = 0
+
+    def _histogram(self, small):
+        hist = cv2.calcHist([small], [0], None, [self.bins], [0, 256])
+        return cv2.normalize(hist, hist).flatten()
+
+    def check(self, frame):
+        """
+        Return True if the frame should be analyzed, making it the new reference
+        """
+        self.checked += 1
+        small = downscale_gray(frame)
+        hist = self._histogram(small)
+
+        if self.reference_small is not None:
+            difference = frame_difference(self.reference_small, small)
+            correlation = cv2.compareHist(self.reference_hist, hist, cv2.HISTCMP_CORREL)
+            if difference <= self.pixel_threshold and correlation >= self.histogram_threshold:
+                self.skipped += 1
+                return False
+
+        self.reference_small = small
+        self.reference_hist = hist
+        return True
+
+    def skip_ratio(self):
+        """
+        Fraction of checked frames that were skipped
+        """
+        return self.skipped / self.checked if self.checked else 0.0
@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from metrics import METRICS
+
+# Rekognition rejects images passed as bytes above this size
+REKOGNITION_MAX_BYTES = 5 * 1024 * 1024
+
+# Rows copied at a time when filling a memory-mapped pixel array
+MEMMAP_STRIP_ROWS = 256
+
+
+def _memmap_array(shape, directory=None):
+    """Writable uint8 array backed by an anonymous temporary file"""
+    fd, path = tempfile.mkstemp(prefix='rekognition_pixels_', suffix='.raw', dir=directory)
+    os.close(fd)
+    try:
+        return np.memmap(path, dtype=np.uint8, mode='w+', shape=shape)
+    finally:
+        try:
+            # The mapping stays valid; the file disappears once it is released
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+@METRICS.timed('decode')
+def decode_image(image_bytes, memmap_min_pixels=None, memmap_dir=None):
+    """
+    Decode image bytes into an RGB pixel array (height x width x 3, uint8)
+
+    The array is meant to be decoded once per image and shared by every stage
+    that needs pixels. Images with at least memmap_min_pixels pixels are copied
+    strip by strip into a memory-mapped temporary file instead of process memory,
+    so the kernel can page out very large images between stages.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    width, height = image.size
+    if memmap_min_pixels is None or width * height < memmap_min_pixels:
+        return np.asarray(image)
+
+    pixels = _memmap_array((height, width, 3), memmap_dir)
+    for top in range(0, height, MEMMAP_STRIP_ROWS):
+        bottom = min(height, top + MEMMAP_STRIP_ROWS)
+        pixels[top:bottom] = np.asarray(image.crop((0, top, width, bottom)))
+    return pixels
+
+
+class ImagePreprocessor:
+    """
+    Shrinks images before they are sent to Rekognition
+
+    Images larger than max_dimension on either side are downscaled and
+    recompressed as JPEG at the given quality. JPEGs take a fast path: the
+    decoder's draft mode scales by 1/2, 1/4 or 1/8 while decoding, so most of the
+    full-size image is never decompressed. Images still above max_bytes are
+    recompressed at lower quality, then at smaller sizes, until they fit.
+
+    Rekognition bounding boxes are relative to the image size, so they stay valid
+    for the original image.
+    """
+
+    def __init__(self, max_dimension=1920, quality=85, max_bytes=REKOGNITION_MAX_BYTES, min_quality=50):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.min_quality = min_quality
+
+    def params(self):
+        """Settings that change the output, for cache keys"""
+        return {'max_dimension': self.max_dimension, 'quality': self.quality, 'max_bytes': self.max_bytes}
+
+    def needs_resize(self, size):
+        return max(size) > self.max_dimension
+
+    @METRICS.timed('preprocess')
+    def prepare(self, image_bytes, pixels=None):
+        """
+        Return bytes to send to Rekognition, the original bytes when they already fit
+
+        pixels is the image's already decoded array (see decode_image), if any; it
+        is resized directly instead of decoding the bytes again.
+        """
+        if pixels is not None:
+            if not self.needs_resize(pixels.shape[1::-1]) and len(image_bytes) <= self.max_bytes:
+                return image_bytes
+            return self.shrink(Image.fromarray(pixels), self.max_dimension)
+
+        image = Image.open(io.BytesIO(image_bytes))
+        if (not self.needs_resize(image.size) and len(image_bytes) <= self.max_bytes
+                and image.format in ('JPEG', 'PNG')):
+            return image_bytes
+
+        return self.shrink(image, self.max_dimension)
+
+    def shrink(self, image, max_dimension):
+        """Downscale an opened image to max_dimension and encode it within max_bytes"""
+        while True:
+            target = (max_dimension, max_dimension)
+            if image.format == 'JPEG':
+                # Decode at the smallest 1/2^n scale still at least the target size
+                image.draft('RGB', target)
+            resized = image.convert('RGB')
+            # reducing_gap reduces by whole factors first, then resamples the rest
+            resized.thumbnail(target, Image.LANCZOS, reducing_gap=2.0)
+
+            quality = self.quality
+            while True:
+                data = self.encode(resized, quality)
+                if len(data) <= self.max_bytes or quality <= self.min_quality:
+                    break
+                quality = max(self.min_quality, quality - 10)
+
+            if len(data) <= self.max_bytes or max_dimension <= 64:
+                return data
+            max_dimension = int(max_dimension * 0.75)
+
+    @staticmethod
+    def encode(image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
@@ -1,8 +1,5 @@
-import boto3
 import json
 import requests
-from PIL import Image
-import io
 import cv2
 import numpy as np
 import matplotlib
@@ -12,12 +9,82 @@ from matplotlib.patches import Rectangle
 import random
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bulk_analysis import BulkImageAnalyzer, read_file, s3_job
+from buffer_pool import BufferPool
+from s3_utils import download_object, iter_bucket_objects
+from result_cache import ResultCache, image_digest
+from metrics import METRICS, export_from_env
+from rate_limit import RateLimitedCaller
+from checkpoint import CheckpointJournal, atomic_write
+from aws_clients import CALLER_RETRIES, get_client
+from image_prep import decode_image
+from raster_render import RasterRenderer
+from summary_plots import SummaryFigureTemplate, summarize_results
+
+# Rekognition operations analyze_image can run, keyed by the result entry they fill:
+# name -> (client method, request parameters, response key)
+REKOGNITION_OPERATIONS = {
+    'faces': ('detect_faces', {'Attributes': ['ALL']}, 'FaceDetails'),
+    'labels': ('detect_labels', {'MaxLabels': 10, 'MinConfidence': 70}, 'Labels'),
+    'text': ('detect_text', {}, 'TextDetections'),
+    'moderation': ('detect_moderation_labels', {'MinConfidence': 70}, 'ModerationLabels'),
+}
 
 class RekognitionImageTester:
-    def __init__(self, region_name='us-east-1'):
-        """Initialize the Rekognition client, default region is us-east-1"""
+    def __init__(self, region_name='us-east-1', concurrent=False, max_workers=8,
+                 operations=('faces', 'labels'), cache=None, output_dir='rekognition_output',
+                 endpoint_url=None, rekognition_client=None, s3_client=None, caller=None,
+                 preprocessor=None, renderer='matplotlib', summary_template=False):
+        """Initialize the Rekognition client, default region is us-east-1
+
+        With concurrent=True the enabled operations for an image are issued at the
+        same time on a thread pool of max_workers threads shared by every call.
+        cache is an optional ResultCache consulted before every Rekognition call.
+        Plots and result files are written to output_dir.
+        
+        endpoint_url points the Rekognition client at another endpoint (such as a
+        FakeRekognitionServer); rekognition_client and s3_client replace the boto3
+        clients entirely (for example with the stand-ins from fake_aws.py).
+        caller is the RateLimitedCaller every Rekognition call goes through; share
+        one between testers to apply a single rate limit (default: retry throttled
+        calls, no rate limit).
+        Default clients come from aws_clients.get_client, so testers share pooled
+        connections sized for max_workers concurrent calls; the Rekognition
+        client leaves retrying to caller.
+        preprocessor is an optional ImagePreprocessor that downscales and
+        recompresses image bytes before they are sent.
+        renderer draws saved detection images with 'matplotlib' (the full figure)
+        or 'raster' (boxes drawn onto the pixels with OpenCV, much faster); plots
+        shown interactively always use matplotlib.
+        summary_template=True saves summary plots by updating one pre-built figure
+        per thread instead of building a new figure for every image.
+        """
+        if renderer not in ('matplotlib', 'raster'):
+            raise ValueError(f"Unknown renderer: {renderer}")
+        unknown = [name for name in operations if name not in REKOGNITION_OPERATIONS]
+        if unknown:
+            raise ValueError(f"Unknown Rekognition operations: {', '.join(unknown)}")
+        self.operations = tuple(operations)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers) if concurrent else None
+        self.region_name = region_name
+        self.cache = cache
+        self.output_dir = output_dir
+        self.s3 = s3_client
+        self.caller = caller or RateLimitedCaller()
+        self.preprocessor = preprocessor
+        self.renderer = renderer
+        self.raster_renderer = RasterRenderer() if renderer == 'raster' else None
+        self.summary_template = summary_template
+        self.templates = threading.local()
+        
         try:
-            self.rekognition = boto3.client('rekognition', region_name=region_name)
+            self.rekognition = rekognition_client or get_client(
+                'rekognition', region_name=region_name, endpoint_url=endpoint_url,
+                max_pool_connections=max_workers, **CALLER_RETRIES
+            )
             print("✓ AWS Rekognition client initialized successfully")
             
             # Setup matplotlib backend
@@ -66,8 +133,9 @@ class RekognitionImageTester:
         
         if not self.interactive_mode:
             print("📁 Non-interactive mode detected - images will be saved to files")
-            os.makedirs('rekognition_output', exist_ok=True)
+            os.makedirs(self.output_dir, exist_ok=True)
     
+    @METRICS.timed('download', source='http')
     def download_test_image(self, url):
         """Download a test image from URL"""
         try:
@@ -78,46 +146,178 @@ class RekognitionImageTester:
             print(f"Error downloading image: {e}")
             return None
     
-    def analyze_image(self, image_bytes):
-        """Analyze image with Rekognition"""
-        results = {}
+    def close(self):
+        """Shut down the shared operation thread pool, if any"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+    
+    def _cached_operation(self, name, image_id):
+        """Look up one operation's cached detections
+        
+        Returns (cache key or None, outcome as from _run_operation or None on a miss).
+        """
+        if self.cache is None or image_id is None:
+            return None, None
+        method_name, params, _response_key = REKOGNITION_OPERATIONS[name]
+        start = time.perf_counter()
+        cache_key = ResultCache.make_key(image_id, method_name, params, self.region_name)
+        detections = self.cache.get(cache_key)
+        if detections is None:
+            return cache_key, None
+        METRICS.increment('cache_hits_total', operation=name)
+        return cache_key, (detections, time.perf_counter() - start, None)
+    
+    def _run_operation(self, name, image, cache_key=None):
+        """Run one Rekognition operation, caching its detections under cache_key
         
-        # Detect faces
-        try:
-            face_response = self.rekognition.detect_faces(
-                Image={'Bytes': image_bytes},
-                Attributes=['ALL']
-            )
-            results['faces'] = face_response.get('FaceDetails', [])
-        except Exception as e:
-            print(f"Error detecting faces: {e}")
-            results['faces'] = []
+        Returns (detections, duration in seconds, error message or None).
+        """
+        method_name, params, response_key = REKOGNITION_OPERATIONS[name]
+        start = time.perf_counter()
         
-        # Detect labels/objects
         try:
-            label_response = self.rekognition.detect_labels(
-                Image={'Bytes': image_bytes},
-                MaxLabels=10,
-                MinConfidence=70
-            )
-            results['labels'] = label_response.get('Labels', [])
+            with METRICS.timer('rekognition', operation=name):
+                response = self.caller.call(
+                    method_name,
+                    getattr(self.rekognition, method_name),
+                    Image=image,
+                    **params
+                )
+            detections = response.get(response_key, [])
+            if cache_key is not None:
+                self.cache.put(cache_key, detections)
         except Exception as e:
-            print(f"Error detecting labels: {e}")
-            results['labels'] = []
+            print(f"Error detecting {name}: {e}")
+            return [], time.perf_counter() - start, str(e)
+        return detections, time.perf_counter() - start, None
+    
+    def analyze_image(self, image_bytes=None, s3_object=None, etag=None, pixels=None):
+        """Analyze image with Rekognition
+        
+        Pass either the image bytes or s3_object, a {'Bucket': ..., 'Name': ...}
+        reference that Rekognition reads directly from S3 (the bucket must be in the
+        client's region), so the image never passes through this process.
+        
+        Cached results are keyed by a hash of the image bytes; S3 references are
+        keyed by their location plus etag, and are only cached when an etag (or
+        object Version) identifies the content.
+        
+        With a preprocessor the bytes are shrunk before they are sent (and cached
+        under the preprocessing settings too); S3 references are sent as they are.
+        Preprocessing only happens when some operation misses the cache. pixels is
+        the image's decoded array, if the caller already has one, and saves the
+        preprocessor decoding the bytes again.
+        
+        Returns a dict with one entry per enabled operation ('faces', 'labels', ...)
+        plus 'timings', the seconds each operation took. Operations that failed
+        (after retries) are listed with their error under 'errors', so an empty
+        detection list is never mistaken for a real result.
+        """
+        if (image_bytes is None) == (s3_object is None):
+            raise ValueError("Provide exactly one of image_bytes or s3_object")
+        
+        image_id = None
+        if self.cache is not None:
+            if image_bytes is not None:
+                image_id = image_digest(image_bytes)
+                if self.preprocessor is not None:
+                    image_id = [image_id, self.preprocessor.params()]
+            elif etag or s3_object.get('Version'):
+                image_id = [s3_object, etag]
         
+        results = {}
+        timings = {}
+        errors = {}
+        
+        outcomes = {}
+        misses = {}
+        for name in self.operations:
+            cache_key, outcome = self._cached_operation(name, image_id)
+            if outcome is not None:
+                outcomes[name] = outcome
+            else:
+                misses[name] = cache_key
+        
+        if misses:
+            if s3_object is not None:
+                image = {'S3Object': s3_object}
+            elif self.preprocessor is not None:
+                image = {'Bytes': self.preprocessor.prepare(image_bytes, pixels)}
+            else:
+                image = {'Bytes': image_bytes}
+            
+            if self.executor is not None:
+                # Issue every remaining operation at once
+                futures = {
+                    name: self.executor.submit(self._run_operation, name, image, cache_key)
+                    for name, cache_key in misses.items()
+                }
+                outcomes.update((name, future.result()) for name, future in futures.items())
+            else:
+                outcomes.update((name, self._run_operation(name, image, cache_key))
+                                for name, cache_key in misses.items())
+        
+        # Join them in a fixed order
+        for name in self.operations:
+            detections, seconds, error = outcomes[name]
+            results[name] = detections
+            timings[name] = seconds
+            if error is not None:
+                errors[name] = error
+        
+        results['timings'] = timings
+        if errors:
+            results['errors'] = errors
         return results
     
-    def visualize_results(self, image_bytes, results, image_name):
-        """Visualize detection results with bounding boxes using matplotlib"""
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
+    def visualize_results(self, image_bytes, results, image_name, show=None, summary=True, pixels=None):
+        """Visualize detection results with bounding boxes using matplotlib
+        
+        show: display the plots interactively; defaults to the detected backend mode,
+        False always saves to files.
+        summary: also create the summary statistics plot
+        pixels: the image's decoded array (see decode_image), to avoid decoding again
+        """
+        if show is None:
+            show = self.interactive_mode
+        
+        image = pixels if pixels is not None else self.decode_image(image_bytes)
+        if self.raster_renderer is not None and not show:
+            self.save_raster(image, results, image_name)
+            if summary:
+                self.create_summary_plot(results, image_name, show=show)
+            return
         
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        fig = self.build_detection_figure(image, results, image_name)
         
+        # Save or show the plot
+        if show:
+            try:
+                plt.show()
+            except Exception as e:
+                print(f"⚠️  Interactive display failed: {e}")
+                self.save_plot(fig, f'detection_results_{image_name}')
+        else:
+            self.save_plot(fig, f'detection_results_{image_name}')
+        
+        plt.close(fig)  # Clean up memory
+        
+        # Also create a summary statistics plot
+        if summary:
+            self.create_summary_plot(results, image_name, show=show)
+    
+    @staticmethod
+    def decode_image(image_bytes, memmap_min_pixels=None):
+        """Decode image bytes into an RGB pixel array (see image_prep.decode_image)"""
+        return decode_image(image_bytes, memmap_min_pixels)
+    
+    @staticmethod
+    @METRICS.timed('render', figure='detections')
+    def build_detection_figure(image, results, image_name):
+        """Build the face and object detection figure for a decoded RGB pixel array"""
         # Get image dimensions
-        img_width, img_height = image.size
+        img_height, img_width = image.shape[:2]
         
         # Create figure with subplots
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
@@ -243,58 +443,93 @@ class RekognitionImageTester:
                     bbox=dict(boxstyle='round,pad=0.5', facecolor='yellow', alpha=0.7))
         
         plt.tight_layout()
+        return fig
+    
+    @staticmethod
+    def clean_filename(filename):
+        """Reduce a name to characters that are safe in a filename"""
+        clean_filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        return clean_filename.replace(' ', '_')
+    
+    @METRICS.timed('save', output='png')
+    def save_plot(self, fig, filename, bbox_inches='tight'):
+        """Save plot to file"""
+        filepath = os.path.join(self.output_dir, f'{self.clean_filename(filename)}.png')
+        
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with atomic_write(filepath) as tmp_path:
+                fig.savefig(tmp_path, dpi=150, bbox_inches=bbox_inches, facecolor='white')
+            print(f"💾 Saved visualization: {filepath}")
+        except Exception as e:
+            print(f"❌ Failed to save plot: {e}")
+    
+    def save_raster(self, pixels, results, image_name):
+        """Draw detections onto the image with the raster renderer and save it as JPEG"""
+        canvas = self.raster_renderer.render(pixels, results, image_name)
+        filepath = os.path.join(self.output_dir, f'detection_results_{self.clean_filename(image_name)}.jpg')
+        self.raster_renderer.save(canvas, filepath)
+        print(f"💾 Saved visualization: {filepath}")
+        return filepath
+    
+    @METRICS.timed('save', output='json')
+    def save_results(self, results, image_name):
+        """Save raw analysis results as JSON, returning the file path"""
+        results_dir = os.path.join(self.output_dir, 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        filepath = os.path.join(results_dir, f'{self.clean_filename(image_name)}.json')
+        with atomic_write(filepath) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'image': image_name, **results}, f, indent=2, default=str)
+        return filepath
+    
+    def create_summary_plot(self, results, image_name, show=None):
+        """Create summary statistics visualization"""
+        if show is None:
+            show = self.interactive_mode
+        
+        if self.summary_template and not show:
+            template = getattr(self.templates, 'summary', None)
+            if template is None:
+                template = self.templates.summary = SummaryFigureTemplate()
+            template.update(results, image_name)
+            self.save_plot(template.figure, f'summary_stats_{image_name}', bbox_inches=None)
+            self.display_results(results, image_name)
+            return
+        
+        fig = self.build_summary_figure(results, image_name)
         
         # Save or show the plot
-        if self.interactive_mode:
+        if show:
             try:
                 plt.show()
             except Exception as e:
                 print(f"⚠️  Interactive display failed: {e}")
-                self.save_plot(fig, f'detection_results_{image_name}')
+                self.save_plot(fig, f'summary_stats_{image_name}')
         else:
-            self.save_plot(fig, f'detection_results_{image_name}')
+            self.save_plot(fig, f'summary_stats_{image_name}')
         
         plt.close(fig)  # Clean up memory
-        
-        # Also create a summary statistics plot
-        self.create_summary_plot(results, image_name)
+        self.display_results(results, image_name)
     
-    def save_plot(self, fig, filename):
-        """Save plot to file"""
-        # Clean filename
-        clean_filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        clean_filename = clean_filename.replace(' ', '_')
-        filepath = f'rekognition_output/{clean_filename}.png'
-        
-        try:
-            fig.savefig(filepath, dpi=150, bbox_inches='tight', facecolor='white')
-            print(f"💾 Saved visualization: {filepath}")
-        except Exception as e:
-            print(f"❌ Failed to save plot: {e}")
-    
-    def create_summary_plot(self, results, image_name):
-        """Create summary statistics visualization"""
+    @staticmethod
+    @METRICS.timed('render', figure='summary')
+    def build_summary_figure(results, image_name):
+        """Build the summary statistics figure for one image's results"""
         faces = results.get('faces', [])
         labels = results.get('labels', [])
+        stats = summarize_results(results)
         
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
         fig.suptitle(f'Detection Summary: {image_name}', fontsize=16, fontweight='bold')
         
         # Face emotions distribution
         if faces:
-            all_emotions = {}
-            for face in faces:
-                emotions = face.get('Emotions', [])
-                for emotion in emotions:
-                    emotion_type = emotion['Type']
-                    confidence = emotion['Confidence']
-                    if emotion_type not in all_emotions:
-                        all_emotions[emotion_type] = []
-                    all_emotions[emotion_type].append(confidence)
+            all_emotions = stats['emotions']
             
             if all_emotions:
                 emotion_names = list(all_emotions.keys())
-                emotion_scores = [max(scores) for scores in all_emotions.values()]
+                emotion_scores = list(all_emotions.values())
                 
                 bars = ax1.bar(emotion_names, emotion_scores, color='skyblue', alpha=0.8)
                 ax1.set_title('Detected Emotions (Max Confidence)', fontweight='bold')
@@ -312,12 +547,7 @@ class RekognitionImageTester:
         
         # Age distribution
         if faces:
-            ages = []
-            for face in faces:
-                age_range = face.get('AgeRange', {})
-                if age_range:
-                    avg_age = (age_range.get('Low', 0) + age_range.get('High', 0)) / 2
-                    ages.append(avg_age)
+            ages = stats['ages']
             
             if ages:
                 ax2.hist(ages, bins=max(1, len(ages)), color='lightcoral', alpha=0.8, edgecolor='black')
@@ -335,9 +565,8 @@ class RekognitionImageTester:
         
         # Top objects/labels
         if labels:
-            top_labels = sorted(labels, key=lambda x: x['Confidence'], reverse=True)[:8]
-            label_names = [label['Name'] for label in top_labels]
-            label_scores = [label['Confidence'] for label in top_labels]
+            label_names = [name for name, _ in stats['top_labels']]
+            label_scores = [score for _, score in stats['top_labels']]
             
             bars = ax3.barh(label_names, label_scores, color='lightgreen', alpha=0.8)
             ax3.set_title('Top Detected Objects/Labels', fontweight='bold')
@@ -353,11 +582,7 @@ class RekognitionImageTester:
             ax3.set_title('Top Detected Objects/Labels', fontweight='bold')
         
         # Detection counts
-        detection_counts = {
-            'Faces': len(faces),
-            'Total Labels': len(labels),
-            'Labels w/ Boxes': sum(1 for label in labels if label.get('Instances'))
-        }
+        detection_counts = stats['counts']
         
         bars = ax4.bar(detection_counts.keys(), detection_counts.values(), 
                       color=['gold', 'mediumpurple', 'orange'], alpha=0.8)
@@ -370,18 +595,9 @@ class RekognitionImageTester:
                     str(count), ha='center', va='bottom', fontweight='bold', fontsize=12)
         
         plt.tight_layout()
-        
-        # Save or show the plot
-        if self.interactive_mode:
-            try:
-                plt.show()
-            except Exception as e:
-                print(f"⚠️  Interactive display failed: {e}")
-                self.save_plot(fig, f'summary_stats_{image_name}')
-        else:
-            self.save_plot(fig, f'summary_stats_{image_name}')
-        
-        plt.close(fig)  # Clean up memory
+        return fig
+    
+    def display_results(self, results, image_name):
         """Display analysis results"""
         print(f"\n{'='*50}")
         print(f"🔍 Analysis Results for: {image_name}")
@@ -484,8 +700,7 @@ class RekognitionImageTester:
     def test_custom_image(self, image_path):
         """Test with a custom image file"""
         try:
-            with open(image_path, 'rb') as image_file:
-                image_bytes = image_file.read()
+            image_bytes = read_file(image_path)
             
             print(f"🖼️  Analyzing custom image: {image_path}")
             results = self.analyze_image(image_bytes)
@@ -497,54 +712,110 @@ class RekognitionImageTester:
         except Exception as e:
             print(f"❌ Error processing custom image: {e}")
 
-    def test_bucket_image(self, bucket_name, object_key):
-        """Test with an image from S3 bucket"""
+    def test_bucket_image(self, bucket_name, object_key, interactive=True, workers=8,
+                          max_in_flight=None, render=True, use_s3_object=False, checkpoint=None,
+                          memory_budget=None, **listing_options):
+        """Test with an image from S3 bucket
+        
+        With object_key 'all' every matching object is processed as soon as its
+        listing page arrives; listing_options (prefix, suffix, extensions,
+        start_after) are passed to iter_bucket_objects. With interactive=False the
+        bucket is processed by the parallel bulk engine without prompts, and its
+        report dict is returned.
+        
+        With use_s3_object=True Rekognition reads each image straight from the
+        bucket, and the bytes are only downloaded when a visualization is drawn.
+        checkpoint is an optional CheckpointJournal for bulk runs: objects it lists
+        are skipped and finished objects are added, so a rerun resumes the sweep.
+        memory_budget caps the bytes of downloaded images held at once in bulk
+        runs; objects are streamed into reusable buffers and downloads wait while
+        the budget is used up.
+        """
         try:
-            s3 = boto3.client('s3')
+            s3 = self.s3 or get_client('s3', max_pool_connections=workers)
+            if object_key.lower() == 'all' and not interactive:
+                return self.analyze_bucket(s3, bucket_name, workers, max_in_flight, render,
+                                           use_s3_object, checkpoint, memory_budget, **listing_options)
+            
             if object_key.lower() == 'all':
                 # List all objects in the bucket
                 print(f"📂 Listing all images in bucket: {bucket_name}")
-                response = s3.list_objects_v2(Bucket=bucket_name)
-                if 'Contents' not in response:
-                    print("❌ No objects found in the bucket")
-                    return
-                
-                for obj in response['Contents']:
-                    object_key = obj['Key']
-                    print(f"🖼️  Processing image: {object_key}")
-                    response = s3.get_object(Bucket=bucket_name, Key=object_key)
-                    image_bytes = response['Body'].read()
-                    # Analyze the image
-                    results = self.analyze_image(image_bytes)
-                    # Show visual results
-                    print("\n📊 Generating visualizations...")
-                    self.visualize_results(image_bytes, results, object_key)
+                found = False
+                for obj in iter_bucket_objects(s3, bucket_name, **listing_options):
+                    found = True
+                    print(f"🖼️  Processing image: {obj['Key']}")
+                    self._analyze_bucket_object(s3, bucket_name, obj['Key'], use_s3_object,
+                                                etag=obj.get('ETag'))
                     input("\nPress Enter to continue to next image...")
+                if not found:
+                    print("❌ No images found in the bucket")
                 return
 
-            response = s3.get_object(Bucket=bucket_name, Key=object_key)
-            image_bytes = response['Body'].read()
             print(f"🖼️  Analyzing image from S3: {object_key} in bucket {bucket_name}")
-            results = self.analyze_image(image_bytes)
-            
-            # Show visual results
-            print("\n📊 Generating visualizations...")
-            self.visualize_results(image_bytes, results, object_key)
+            self._analyze_bucket_object(s3, bucket_name, object_key, use_s3_object)
 
         except Exception as e:
             print(f"❌ Error processing image from S3: {e}")
 
+    def _analyze_bucket_object(self, s3, bucket_name, object_key, use_s3_object=False, etag=None):
+        """Analyze and visualize a single S3 object"""
+        if use_s3_object:
+            results = self.analyze_image(s3_object={'Bucket': bucket_name, 'Name': object_key},
+                                         etag=etag)
+            image_bytes = download_object(s3, bucket_name, object_key)
+        else:
+            image_bytes = download_object(s3, bucket_name, object_key)
+            results = self.analyze_image(image_bytes)
+        
+        # Show visual results
+        print("\n📊 Generating visualizations...")
+        self.visualize_results(image_bytes, results, object_key)
+
+    def analyze_bucket(self, s3, bucket_name, workers=8, max_in_flight=None, render=True,
+                       use_s3_object=False, checkpoint=None, memory_budget=None, **listing_options):
+        """Analyze every image in a bucket with the parallel bulk engine
+        
+        Objects are streamed from the paginated listing into the engine, so work
+        starts with the first page instead of after the whole bucket is listed.
+        With use_s3_object=True and render=False no image bytes are downloaded.
+        """
+        print(f"📂 Bulk analyzing all images in bucket: {bucket_name} ({workers} workers)")
+        
+        buffer_pool = BufferPool(memory_budget) if memory_budget else None
+        jobs = (
+            s3_job(s3, bucket_name, obj['Key'], obj.get('ETag'), use_s3_object, obj.get('LastModified'),
+                   buffer_pool, obj.get('Size'))
+            for obj in iter_bucket_objects(s3, bucket_name, **listing_options)
+        )
+        outputs = ('detections', 'summary') if render else ()
+        engine = BulkImageAnalyzer(self, workers=workers, max_in_flight=max_in_flight, outputs=outputs,
+                                   checkpoint=checkpoint, buffer_pool=buffer_pool)
+        report = engine.run(jobs)
+        if report['processed'] == 0 and report['failed'] == 0 and report['skipped'] == 0:
+            print("❌ No images found in the bucket")
+        return report
 
 
-def main():
-    """Main function"""
+
+def main(argv=None):
+    """Main function
+    
+    Runs the interactive menu, or the headless batch command when arguments
+    are given (see batch.py).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        # Imported here because batch.py itself imports this module
+        import batch
+        return batch.main(argv)
+    
     print("🧪 AWS Rekognition Visual Analysis Tool")
     print("This script analyzes images and shows visual bounding boxes!")
     print("=" * 60)
     
     try:
         # Initialize tester
-        tester = RekognitionImageTester()
+        tester = RekognitionImageTester(concurrent=True, cache=ResultCache())
         
         print("\nChoose an option:")
         print("1. Test with sample images from the internet")
@@ -571,7 +842,20 @@ def main():
         elif choice == '3':
             bucket_name = input("Enter the S3 bucket name: ").strip()
             object_key = input("Enter the S3 object key (name of the file) or type \"all\" for all images: ").strip()
-            if bucket_name and object_key:
+            if bucket_name and object_key.lower() == 'all':
+                prefix = input("Enter a key prefix to limit the listing (optional): ").strip()
+                bulk = input("Process the whole bucket in parallel without pausing? (y/n): ").lower().strip()
+                checkpoint = None
+                if bulk == 'y':
+                    checkpoint_path = input("Checkpoint file to resume from/record progress (optional): ").strip()
+                    checkpoint = CheckpointJournal(checkpoint_path) if checkpoint_path else None
+                try:
+                    tester.test_bucket_image(bucket_name, object_key, interactive=bulk != 'y',
+                                             checkpoint=checkpoint, prefix=prefix)
+                finally:
+                    if checkpoint is not None:
+                        checkpoint.close()
+            elif bucket_name and object_key:
                 tester.test_bucket_image(bucket_name, object_key)
             else:
                 print("Bucket name or object key not provided")
@@ -580,6 +864,9 @@ def main():
             print("Invalid choice")
             return
             
+        cache_stats = tester.cache.stats()
+        print(f"\n🗄️  Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        
         print("\n✅ Visual analysis completed!")
         print("You should have seen:")
         print("• Bounding boxes around faces and objects")
@@ -594,6 +881,9 @@ def main():
         print("3. Internet connection is working (for sample images)")
         print("4. matplotlib is installed: pip install matplotlib")
         print("5. Your input is correct (image paths, S3 bucket/key)")
+    
+    finally:
+        export_from_env()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,75 @@
+import threading
+
+from results_store import load_manifest
+
+
+def object_changed(obj, entry):
+    """
+    Whether a listed object differs from its stored analysis
+
+    The ETag changes whenever the content does; LastModified is only compared
+    when either side has no ETag (it also changes when identical content is
+    uploaded again, which doesn't need a new analysis).
+    """
+    etag = obj.get('ETag')
+    if etag and entry.get('etag'):
+        return etag != entry['etag']
+    last_modified = obj.get('LastModified')
+    if last_modified is None or entry.get('last_modified') is None:
+        return True
+    return last_modified > entry['last_modified']
+
+
+class IncrementalPlan:
+    """
+    Decides which listed S3 objects a re-run needs to analyze
+
+    Compares bucket listings against the manifest of a results dataset: new and
+    changed objects pass through filter(), unchanged ones are skipped. After the
+    listings, removed() gives the stored sources under the listed prefixes that
+    no longer exist, and replaced() the changed sources with their new ETags, so
+    their stale rows can be deleted from the store and index.
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.prefixes = []
+        self.changed = {}
+        self.new = 0
+        self.unchanged = 0
+
+    @classmethod
+    def from_store(cls, path, format='parquet'):
+        return cls(load_manifest(path, format))
+
+    def filter(self, bucket_name, prefix, objects):
+        """Yield the listed objects that are new or changed since they were stored"""
+        self.prefixes.append(f's3://{bucket_name}/{prefix}')
+        for obj in objects:
+            source = f"s3://{bucket_name}/{obj['Key']}"
+            entry = self.manifest.get(source)
+            with self.lock:
+                self.seen.add(source)
+                if entry is None:
+                    self.new += 1
+                elif object_changed(obj, entry):
+                    self.changed[source] = obj.get('ETag')
+                else:
+                    self.unchanged += 1
+                    continue
+            yield obj
+
+    def removed(self):
+        """Stored sources under the listed prefixes that were not listed"""
+        return [source for source in self.manifest
+                if source not in self.seen and source.startswith(tuple(self.prefixes))]
+
+    def replaced(self, failed=()):
+        """{source: new ETag} for changed objects, leaving out failed sources"""
+        failed = set(failed)
+        return {source: etag for source, etag in self.changed.items() if source not in failed and etag}
+
+    def stats(self):
+        return {'new': self.new, 'changed': len(self.changed), 'unchanged': self.unchanged}
@@ -0,0 +1,235 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Set to a .prom or .jsonl path to export metrics when the scripts exit
+METRICS_FILE_ENV = 'REKOGNITION_METRICS_FILE'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs as Prometheus expects"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and latency histograms for pipeline stages
+
+    Stages are timed with the timer() context manager or the timed() decorator,
+    which record into the stage_duration_seconds histogram and count calls and
+    errors per stage. Gauges hold the latest value of a reading such as a rate.
+    Everything can be exported as Prometheus text or JSON lines.
+    """
+
+    def __init__(self, prefix='rekognition_analyzer', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.exporter = None
+
+    def increment(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge to its current value"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        """Record a value (in seconds) in a histogram"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Time a block as one run of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment('stage_errors_total', stage=stage, **labels)
+            raise
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - start, stage=stage, **labels)
+            self.increment('stage_calls_total', stage=stage, **labels)
+
+    def timed(self, stage, **labels):
+        """Decorator timing every call of a function as a stage"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        for (name, labels), value in gauges:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} gauge')
+                typed.add(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        for (name, labels), histogram in histograms:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            for bound, total in histogram.cumulative():
+                lines.append(f'{metric}_bucket{_format_labels(labels, [("le", bound)])} {total}')
+            lines.append(f'{metric}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram.count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.sum}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json_lines(self):
+        """Render all metrics as one JSON object per line"""
+        timestamp = time.time()
+        records = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                records.append({'time': timestamp, 'name': name, 'type': 'counter',
+                                'labels': dict(labels), 'value': value})
+            for (name, labels), value in sorted(self.gauges.items()):
+                records.append({'time': timestamp, 'name': name, 'type': 'gauge',
+                                'labels': dict(labels), 'value': value})
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                records.append({
+                    'time': timestamp, 'name': name, 'type': 'histogram', 'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                    'p50': histogram.quantile(0.5),
+                    'p90': histogram.quantile(0.9),
+                    'p99': histogram.quantile(0.99),
+                    'buckets': {str(bound): total for bound, total in histogram.cumulative()},
+                })
+        return ''.join(json.dumps(record) + '\n' for record in records)
+
+    def write(self, path):
+        """Write metrics to path, as JSON lines for .jsonl/.json files and Prometheus text otherwise"""
+        data = self.to_json_lines() if path.endswith(('.jsonl', '.json')) else self.to_prometheus()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Replace atomically so scrapers never read a partial file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def start_periodic_export(self, path, interval=15.0):
+        """Rewrite the metrics file every interval seconds until stop_periodic_export"""
+        self.stop_periodic_export()
+        stop = threading.Event()
+
+        def export():
+            while not stop.wait(interval):
+                self.write(path)
+
+        thread = threading.Thread(target=export, name='metrics-export', daemon=True)
+        thread.start()
+        self.exporter = (thread, stop, path)
+
+    def stop_periodic_export(self):
+        """Stop periodic export, writing the file one last time"""
+        if self.exporter is not None:
+            thread, stop, path = self.exporter
+            stop.set()
+            thread.join()
+            self.write(path)
+            self.exporter = None
+
+
+# Shared registry used by the analyzers
+METRICS = Metrics()
+
+
+def export_from_env():
+    """Write METRICS to the file named by REKOGNITION_METRICS_FILE, if set"""
+    path = os.environ.get(METRICS_FILE_ENV)
+    if path:
+        METRICS.write(path)
+        print(f"📈 Metrics written to {path}")
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from metrics import METRICS
+
+# Error codes worth retrying after a backoff
+RETRYABLE_ERRORS = {
+    'ThrottlingException',
+    'ProvisionedThroughputExceededException',
+    'LimitExceededException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'ServiceUnavailableException',
+    'InternalServerError',
+}
+
+# Transport errors worth retrying; botocore doesn't retry them for clients that
+# leave retrying to RateLimitedCaller
+RETRYABLE_EXCEPTIONS = (
+    EndpointConnectionError,
+    ConnectTimeoutError,
+    ReadTimeoutError,
+    ConnectionClosedError,
+)
+
+
+def error_code(error):
+    """AWS error code of an exception, or None for non-AWS errors"""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code')
+    return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing rate calls per second with bursts up to capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1.0):
+        """Block until tokens are available and take them, returning the seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """Per-operation token buckets shared by every worker"""
+
+    def __init__(self, limits=None, default_tps=None):
+        """
+        limits: {operation: calls per second}, e.g. {'detect_faces': 50}
+        default_tps: limit for operations not listed in limits (None for unlimited)
+        """
+        self.limits = dict(limits or {})
+        self.default_tps = default_tps
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, operation):
+        with self.lock:
+            if operation not in self.buckets:
+                tps = self.limits.get(operation, self.default_tps)
+                self.buckets[operation] = TokenBucket(tps) if tps else None
+            return self.buckets[operation]
+
+    def acquire(self, operation):
+        """Wait for permission to make one call to an operation"""
+        bucket = self._bucket(operation)
+        if bucket is not None:
+            waited = bucket.acquire()
+            if waited:
+                METRICS.observe('rate_limit_wait_seconds', waited, operation=operation)
+
+
+class RateLimitedCaller:
+    """
+    Makes AWS calls through a shared rate limiter, retrying throttling and transport errors
+
+    Retries use exponential backoff with full jitter: attempt n sleeps a random
+    time between 0 and min(max_delay, base_delay * 2**n). Calls still failing
+    after max_attempts are dropped and their last error re-raised, so callers
+    can tell a failed call from an empty result.
+    """
+
+    def __init__(self, limiter=None, max_attempts=6, base_delay=0.1, max_delay=10.0):
+        self.limiter = limiter or RateLimiter()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.drops = 0
+
+    def backoff(self, attempt):
+        """Seconds to sleep before retry number attempt (starting at 0)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, operation, func, *args, **kwargs):
+        """Call func(*args, **kwargs) as one request to operation"""
+        with self.lock:
+            self.calls += 1
+
+        for attempt in range(self.max_attempts):
+            self.limiter.acquire(operation)
+            try:
+                return func(*args, **kwargs)
+            except (ClientError, *RETRYABLE_EXCEPTIONS) as e:
+                if isinstance(e, ClientError):
+                    code = error_code(e)
+                    if code not in RETRYABLE_ERRORS:
+                        raise
+                    METRICS.increment('throttled_total', operation=operation, code=code)
+                else:
+                    METRICS.increment('transport_errors_total', operation=operation,
+                                      error=type(e).__name__)
+                if attempt == self.max_attempts - 1:
+                    with self.lock:
+                        self.drops += 1
+                    METRICS.increment('dropped_total', operation=operation)
+                    raise
+                with self.lock:
+                    self.retries += 1
+                METRICS.increment('retries_total', operation=operation)
+                time.sleep(self.backoff(attempt))
+
+    def stats(self):
+        with self.lock:
+            return {'calls': self.calls, 'retries': self.retries, 'drops': self.drops}
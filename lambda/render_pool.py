@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from checkpoint import atomic_write
+from metrics import METRICS
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def _init_worker(output_dir, renderer, region_name, summary_template):
+    """Prepare a render process: off-screen matplotlib and its own S3 client"""
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    _worker.update(output_dir=output_dir, renderer=renderer, region_name=region_name, s3=None,
+                   summary_template=summary_template, template=None)
+
+
+def _load_bytes(source):
+    """Image bytes for a source: raw bytes, ('file', path) or ('s3', bucket, key)"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    kind = source[0]
+    if kind == 'file':
+        with open(source[1], 'rb') as f:
+            return f.read()
+    if kind == 's3':
+        from aws_clients import get_client
+        from s3_utils import download_object
+        if _worker['s3'] is None:
+            _worker['s3'] = get_client('s3', region_name=_worker['region_name'])
+        return download_object(_worker['s3'], source[1], source[2])
+    raise ValueError(f"Unknown image source: {kind}")
+
+
+def _save_figure(fig, filename, bbox_inches='tight'):
+    from images import RekognitionImageTester
+    filepath = os.path.join(_worker['output_dir'], f'{RekognitionImageTester.clean_filename(filename)}.png')
+    with atomic_write(filepath) as tmp_path:
+        fig.savefig(tmp_path, dpi=150, bbox_inches=bbox_inches, facecolor='white')
+    return filepath
+
+
+def render_job(source, results, image_name, outputs):
+    """Render one image's outputs in a worker process, returning the files written"""
+    import matplotlib.pyplot as plt
+    from image_prep import decode_image
+    from images import RekognitionImageTester
+
+    paths = []
+    if 'detections' in outputs:
+        pixels = decode_image(_load_bytes(source))
+        if _worker['renderer'] == 'raster':
+            from raster_render import RasterRenderer
+            filename = RekognitionImageTester.clean_filename(f'detection_results_{image_name}')
+            renderer = RasterRenderer()
+            paths.append(renderer.save(renderer.render(pixels, results, image_name),
+                                       os.path.join(_worker['output_dir'], f'{filename}.jpg')))
+        else:
+            fig = RekognitionImageTester.build_detection_figure(pixels, results, image_name)
+            try:
+                paths.append(_save_figure(fig, f'detection_results_{image_name}'))
+            finally:
+                plt.close(fig)
+
+    if 'summary' in outputs and _worker['summary_template']:
+        from summary_plots import SummaryFigureTemplate
+        if _worker['template'] is None:
+            _worker['template'] = SummaryFigureTemplate()
+        fig = _worker['template'].update(results, image_name)
+        paths.append(_save_figure(fig, f'summary_stats_{image_name}', bbox_inches=None))
+    elif 'summary' in outputs:
+        fig = RekognitionImageTester.build_summary_figure(results, image_name)
+        try:
+            paths.append(_save_figure(fig, f'summary_stats_{image_name}'))
+        finally:
+            plt.close(fig)
+    return paths
+
+
+class RenderPool:
+    """
+    Renders visualizations in worker processes so they use every core
+
+    matplotlib rendering is CPU-bound and holds the GIL, so threads can't render
+    in parallel. Jobs carry an image source (bytes, a local path or an S3
+    location, loaded by the worker) plus the results dict, and the worker writes
+    the output files. submit() blocks while max_pending renders are queued, so
+    rendering can't fall far behind analysis.
+    """
+
+    def __init__(self, output_dir='rekognition_output', processes=None, max_pending=None,
+                 renderer='matplotlib', region_name=None, summary_template=False):
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max_pending or self.processes * 2
+        # spawn avoids forking a parent whose threads may hold locks
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(output_dir, renderer, region_name, summary_template),
+        )
+        self.pending = threading.BoundedSemaphore(self.max_pending)
+
+    def submit(self, source, results, image_name, outputs=('detections', 'summary'), on_done=None):
+        """
+        Queue one image for rendering, blocking while the queue is full
+
+        on_done(future) is called when the render finishes or fails.
+        """
+        with METRICS.timer('render_queue_wait'):
+            self.pending.acquire()
+        try:
+            future = self.executor.submit(render_job, source, results, image_name, tuple(outputs))
+        except Exception:
+            self.pending.release()
+            raise
+
+        def done(completed):
+            self.pending.release()
+            if on_done is not None:
+                on_done(completed)
+
+        future.add_done_callback(done)
+        return future
+
+    def close(self):
+        """Wait for queued renders and stop the worker processes"""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
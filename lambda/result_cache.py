@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def image_digest(image_bytes):
+    """Content hash identifying an image"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of Rekognition responses keyed by image content and request
+
+    Entries live as one JSON file each under cache_dir, with a small in-memory
+    LRU layer in front so repeated hits skip the disk. The disk size is capped at
+    max_bytes (least recently used entries are evicted first) and entries older
+    than ttl_seconds are treated as misses. Values returned from the cache are
+    shared and must not be modified.
+    """
+
+    def __init__(self, cache_dir='rekognition_cache', max_bytes=512 * 1024 * 1024,
+                 ttl_seconds=None, memory_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # key -> (created timestamp, value), most recently used last
+        self.memory = OrderedDict()
+        # key -> file size in bytes, least recently used first
+        self.disk_index = OrderedDict()
+        self.disk_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(image_id, operation, params, region):
+        """Build a cache key from the image identity and the full request parameters"""
+        request = json.dumps([image_id, operation, params, region], sort_keys=True)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        """File holding a cache entry, sharded by the first two hex digits"""
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def _load_disk_index(self):
+        """Index existing entries in access (mtime) order"""
+        entries = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith('.json'):
+                    continue
+                stat = os.stat(os.path.join(root, filename))
+                entries.append((stat.st_mtime, filename[:-5], stat.st_size))
+
+        for _mtime, key, size in sorted(entries):
+            self.disk_index[key] = size
+            self.disk_bytes += size
+
+    def _expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def _remember(self, key, created, value):
+        """Add an entry to the in-memory layer, dropping the oldest beyond capacity"""
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _remove(self, key):
+        """Drop an entry from both layers"""
+        self.memory.pop(key, None)
+        size = self.disk_index.pop(key, None)
+        if size is not None:
+            self.disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._expired(created):
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+            if key in self.disk_index:
+                path = self._path(key)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    entry = None
+                    self._remove(key)
+
+                if entry is not None and not self._expired(entry['created']):
+                    # Touch the file so access order survives restarts
+                    os.utime(path)
+                    self.disk_index.move_to_end(key)
+                    self._remember(key, entry['created'], entry['value'])
+                    self.hits += 1
+                    return entry['value']
+                if entry is not None:
+                    self._remove(key)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a JSON-serializable value under key"""
+        created = time.time()
+        data = json.dumps({'created': created, 'value': value})
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            size = len(data.encode('utf-8'))
+            self.disk_bytes += size - self.disk_index.pop(key, 0)
+            self.disk_index[key] = size
+            self._remember(key, created, value)
+
+            while self.disk_bytes > self.max_bytes and len(self.disk_index) > 1:
+                oldest = next(iter(self.disk_index))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.disk_index),
+                'bytes': self.disk_bytes,
+            }
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+
+from bulk_analysis import job_location
+from results_store import FACE_FLAGS
+
+# Width of a confidence bucket in percentage points
+BUCKET_SIZE = 10
+
+
+def index_terms(results):
+    """
+    Searchable terms of one result, with the highest confidence of each
+
+    Terms are lowercase 'label:<name>', 'face:<attribute>' (for attributes such
+    as sunglasses or smile that are true), 'emotion:<type>' (each face's top
+    emotion) and 'gender:<value>'.
+    """
+    terms = {}
+
+    def add(term, confidence):
+        term = term.lower()
+        terms[term] = max(terms.get(term, 0.0), float(confidence or 0.0))
+
+    for label in results.get('labels', []):
+        add(f"label:{label['Name']}", label['Confidence'])
+
+    for face in results.get('faces', []):
+        for column, attribute in FACE_FLAGS.items():
+            value = face.get(attribute, {})
+            if value.get('Value'):
+                add(f'face:{column}', value.get('Confidence'))
+        emotions = face.get('Emotions', [])
+        if emotions:
+            top_emotion = max(emotions, key=lambda x: x['Confidence'])
+            add(f"emotion:{top_emotion['Type']}", top_emotion['Confidence'])
+        gender = face.get('Gender')
+        if gender:
+            add(f"gender:{gender['Value']}", gender.get('Confidence'))
+    return terms
+
+
+def parse_query(expression):
+    """Parse 'label:Car>=90' (or 'face:sunglasses') into (term, min confidence)"""
+    term, _, minimum = expression.partition('>=')
+    try:
+        min_confidence = float(minimum) if minimum else 0.0
+    except ValueError:
+        raise ValueError(f"Invalid minimum confidence {minimum.strip()!r} in query term {expression!r} "
+                         f"(expected a number, e.g. 'label:Car>=90')") from None
+    return term.strip().lower(), min_confidence
+
+
+class ResultIndex:
+    """
+    Inverted index from label and face attribute terms to image ids
+
+    Postings are grouped by confidence bucket (term -> bucket -> {image: confidence}),
+    so a query reads whole buckets above the threshold and only checks individual
+    confidences in the boundary bucket; lookups are a few dict operations however
+    many images are indexed. Image ids are interned to integers.
+
+    With a path, every change is appended to a JSON lines journal that is replayed
+    on load, so the index builds up incrementally across runs; compact() rewrites
+    the journal with only the current entries. Entries are flushed as they are
+    written, like the checkpoint journal's, so a resumed run never skips images
+    whose index entries were lost in a crash. Thread-safe.
+    """
+
+    def __init__(self, path=None, fsync=False):
+        """fsync: also force every entry to disk, surviving power loss as well as crashes"""
+        self.path = path
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.ids = []          # int -> image id
+        self.numbers = {}      # image id -> int
+        self.documents = {}    # int -> {term: confidence}
+        self.postings = {}     # term -> bucket -> {int: confidence}
+        self.journal = None
+        if path:
+            self._load()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.journal = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted write
+                if entry.get('op') == 'remove':
+                    self._remove(entry['id'])
+                else:
+                    self._add(entry['id'], entry['terms'])
+
+    def _number(self, image_id):
+        number = self.numbers.get(image_id)
+        if number is None:
+            number = self.numbers[image_id] = len(self.ids)
+            self.ids.append(image_id)
+        return number
+
+    def _add(self, image_id, terms):
+        number = self._number(image_id)
+        self._remove_number(number)
+        self.documents[number] = terms
+        for term, confidence in terms.items():
+            bucket = int(confidence // BUCKET_SIZE)
+            self.postings.setdefault(term, {}).setdefault(bucket, {})[number] = confidence
+
+    def _remove(self, image_id):
+        number = self.numbers.get(image_id)
+        if number is not None:
+            self._remove_number(number)
+
+    def _remove_number(self, number):
+        for term, confidence in self.documents.pop(number, {}).items():
+            buckets = self.postings[term]
+            bucket = int(confidence // BUCKET_SIZE)
+            buckets[bucket].pop(number, None)
+            if not buckets[bucket]:
+                del buckets[bucket]
+            if not buckets:
+                del self.postings[term]
+
+    def _log(self, entry):
+        if self.journal is not None:
+            self.journal.write(json.dumps(entry) + '\n')
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+
+    def add(self, image_id, results):
+        """Index (or re-index) one image's results"""
+        terms = index_terms(results)
+        with self.lock:
+            self._add(image_id, terms)
+            self._log({'op': 'add', 'id': image_id, 'terms': terms})
+
+    def add_job(self, job, results):
+        """Index a bulk ImageJob's results (usable as BulkImageAnalyzer's on_result)"""
+        self.add(job_location(job) or job.name, results)
+
+    def remove(self, image_id):
+        """Drop an image from the index"""
+        with self.lock:
+            self._remove(image_id)
+            self._log({'op': 'remove', 'id': image_id})
+
+    def query(self, term, min_confidence=0.0):
+        """Image ids having a term with at least min_confidence, as a set"""
+        term = term.lower()
+        lowest = int(min_confidence // BUCKET_SIZE)
+        with self.lock:
+            numbers = set()
+            for bucket, entries in self.postings.get(term, {}).items():
+                if bucket > lowest:
+                    numbers.update(entries)
+                elif bucket == lowest:
+                    numbers.update(n for n, confidence in entries.items() if confidence >= min_confidence)
+            return {self.ids[number] for number in numbers}
+
+    def search(self, expressions):
+        """Image ids matching every 'term>=confidence' expression, sorted"""
+        matches = None
+        for expression in expressions:
+            found = self.query(*parse_query(expression))
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return sorted(matches or ())
+
+    def terms(self):
+        """Indexed terms with the number of images having each"""
+        with self.lock:
+            return {term: sum(len(entries) for entries in buckets.values())
+                    for term, buckets in self.postings.items()}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def compact(self):
+        """Rewrite the journal with only the current entries"""
+        if not self.path:
+            return
+        with self.lock:
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for number, terms in self.documents.items():
+                    f.write(json.dumps({'op': 'add', 'id': self.ids[number], 'terms': terms}) + '\n')
+            self.journal.close()
+            os.replace(tmp_path, self.path)
+            self.journal = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        if self.journal is not None:
+            with self.lock:
+                self.journal.close()
+                self.journal = None
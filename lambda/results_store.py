@@ -0,0 +1,325 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from bulk_analysis import job_location
+from metrics import METRICS
+
+STORE_FORMATS = ('parquet', 'lance')
+
+BOX_FIELDS = [
+    ('left', pa.float32()),
+    ('top', pa.float32()),
+    ('width', pa.float32()),
+    ('height', pa.float32()),
+]
+
+FACE_TYPE = pa.struct([
+    ('confidence', pa.float32()),
+    ('age_low', pa.int16()),
+    ('age_high', pa.int16()),
+    ('gender', pa.string()),
+    ('gender_confidence', pa.float32()),
+    ('emotion', pa.string()),
+    ('emotion_confidence', pa.float32()),
+    ('smile', pa.bool_()),
+    ('eyeglasses', pa.bool_()),
+    ('sunglasses', pa.bool_()),
+    ('beard', pa.bool_()),
+    ('mustache', pa.bool_()),
+    ('eyes_open', pa.bool_()),
+    ('mouth_open', pa.bool_()),
+    *BOX_FIELDS,
+])
+
+LABEL_TYPE = pa.struct([
+    ('name', pa.string()),
+    ('confidence', pa.float32()),
+    ('parents', pa.list_(pa.string())),
+    ('instances', pa.int16()),
+])
+
+OBJECT_BOX_TYPE = pa.struct([
+    ('label', pa.string()),
+    ('confidence', pa.float32()),
+    *BOX_FIELDS,
+])
+
+# One row per analyzed image; detections are nested lists
+RESULTS_SCHEMA = pa.schema([
+    ('image_id', pa.string()),
+    ('source', pa.string()),
+    ('etag', pa.string()),
+    ('last_modified', pa.timestamp('us', tz='UTC')),
+    ('analyzed_at', pa.timestamp('us', tz='UTC')),
+    ('face_count', pa.int32()),
+    ('label_count', pa.int32()),
+    ('faces', pa.list_(FACE_TYPE)),
+    ('labels', pa.list_(LABEL_TYPE)),
+    ('boxes', pa.list_(OBJECT_BOX_TYPE)),
+])
+
+# Face attributes stored as booleans, by Rekognition attribute name
+FACE_FLAGS = {
+    'smile': 'Smile',
+    'eyeglasses': 'Eyeglasses',
+    'sunglasses': 'Sunglasses',
+    'beard': 'Beard',
+    'mustache': 'Mustache',
+    'eyes_open': 'EyesOpen',
+    'mouth_open': 'MouthOpen',
+}
+
+
+def _box(bbox):
+    return {
+        'left': bbox.get('Left'),
+        'top': bbox.get('Top'),
+        'width': bbox.get('Width'),
+        'height': bbox.get('Height'),
+    }
+
+
+def flatten_face(face):
+    """Columnar record for one FaceDetail"""
+    age_range = face.get('AgeRange', {})
+    gender = face.get('Gender', {})
+    emotions = face.get('Emotions', [])
+    top_emotion = max(emotions, key=lambda x: x['Confidence']) if emotions else {}
+    record = {
+        'confidence': face.get('Confidence'),
+        'age_low': age_range.get('Low'),
+        'age_high': age_range.get('High'),
+        'gender': gender.get('Value'),
+        'gender_confidence': gender.get('Confidence'),
+        'emotion': top_emotion.get('Type'),
+        'emotion_confidence': top_emotion.get('Confidence'),
+        **_box(face.get('BoundingBox', {})),
+    }
+    for column, attribute in FACE_FLAGS.items():
+        record[column] = face.get(attribute, {}).get('Value')
+    return record
+
+
+def flatten_results(image_id, results, source=None, etag=None, last_modified=None, analyzed_at=None):
+    """Flatten one analyze_image() result into a row of RESULTS_SCHEMA"""
+    faces = results.get('faces', [])
+    labels = results.get('labels', [])
+    boxes = []
+    for label in labels:
+        for instance in label.get('Instances', []):
+            if instance.get('BoundingBox'):
+                boxes.append({
+                    'label': label['Name'],
+                    'confidence': instance.get('Confidence', label['Confidence']),
+                    **_box(instance['BoundingBox']),
+                })
+    return {
+        'image_id': image_id,
+        'source': source,
+        'etag': etag,
+        'last_modified': last_modified,
+        'analyzed_at': analyzed_at or datetime.now(timezone.utc),
+        'face_count': len(faces),
+        'label_count': len(labels),
+        'faces': [flatten_face(face) for face in faces],
+        'labels': [{
+            'name': label['Name'],
+            'confidence': label['Confidence'],
+            'parents': [parent['Name'] for parent in label.get('Parents', [])],
+            'instances': len(label.get('Instances', [])),
+        } for label in labels],
+        'boxes': boxes,
+    }
+
+
+def _import_lance():
+    try:
+        import lance
+    except ImportError as e:
+        raise ImportError("The lance format needs the pylance package (pip install pylance)") from e
+    return lance
+
+
+class ResultsStore:
+    """
+    Appends analysis results to a Parquet or Lance dataset in batches
+
+    Results are buffered and written batch_size rows at a time. Parquet batches
+    become new part files in the dataset directory, written to a temporary name
+    and renamed so readers never see partial files; Lance batches are appended
+    to the dataset as new fragments. Thread-safe.
+    """
+
+    def __init__(self, path, format='parquet', batch_size=1000, on_write=None):
+        """on_write(rows) is called after each batch of rows is written"""
+        if format not in STORE_FORMATS:
+            raise ValueError(f"Unknown store format: {format}")
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.rows = []
+        self.lock = threading.Lock()
+        # Serializes writes so Lance appends don't conflict
+        self.write_lock = threading.Lock()
+        self.written = 0
+        self.on_write = on_write
+
+    def add(self, image_id, results, source=None, etag=None, last_modified=None):
+        """Buffer one image's results, writing a batch when the buffer is full"""
+        row = flatten_results(image_id, results, source, etag, last_modified)
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) < self.batch_size:
+                return
+            rows, self.rows = self.rows, []
+        self._write(rows)
+
+    def add_job(self, job, results):
+        """Buffer a bulk ImageJob's results (usable as BulkImageAnalyzer's on_result)"""
+        self.add(job.name, results, job_location(job), job.etag, job.last_modified)
+
+    def flush(self):
+        """Write any buffered rows"""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if rows:
+            self._write(rows)
+
+    @METRICS.timed('save', output='store')
+    def _write(self, rows):
+        table = pa.Table.from_pylist(rows, schema=RESULTS_SCHEMA)
+        with self.write_lock:
+            if self.format == 'lance':
+                lance = _import_lance()
+                mode = 'append' if os.path.exists(self.path) else 'create'
+                lance.write_dataset(table, self.path, mode=mode)
+            else:
+                os.makedirs(self.path, exist_ok=True)
+                name = f'part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet'
+                tmp_path = os.path.join(self.path, f'.{name}.tmp')
+                pq.write_table(table, tmp_path, compression='zstd')
+                os.replace(tmp_path, os.path.join(self.path, name))
+            self.written += len(rows)
+        if self.on_write is not None:
+            self.on_write(rows)
+
+    def _stale_mask(self, table, removed, replaced):
+        """Boolean mask of rows to delete from a table with source and etag columns"""
+        sources = table.column('source')
+        mask = pc.is_in(sources, value_set=pa.array(list(removed), pa.string()))
+        if replaced:
+            # Rows of replaced sources whose ETag isn't the current one
+            positions = pc.index_in(sources, value_set=pa.array(list(replaced), pa.string()))
+            current = pc.take(pa.array(list(replaced.values()), pa.string()), positions)
+            same = pc.fill_null(pc.equal(table.column('etag'), current), False)
+            mask = pc.or_(mask, pc.and_(pc.is_valid(positions), pc.invert(same)))
+        return pc.fill_null(mask, False)
+
+    @METRICS.timed('save', output='store_delete')
+    def delete_stale(self, removed=(), replaced=None):
+        """
+        Delete rows of objects that no longer exist or were re-analyzed
+
+        removed: sources whose rows are all deleted
+        replaced: {source: current etag}; rows for these sources with any other
+            ETag are deleted, keeping the newly written ones
+        Returns the number of rows deleted.
+        """
+        replaced = replaced or {}
+        if not (removed or replaced) or not os.path.exists(self.path):
+            return 0
+        self.flush()
+        with self.write_lock:
+            if self.format == 'lance':
+                return self._delete_lance(removed, replaced)
+            return self._delete_parquet(removed, replaced)
+
+    def _delete_parquet(self, removed, replaced):
+        deleted = 0
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith('.parquet') or name.startswith(('.', '_')):
+                continue
+            path = os.path.join(self.path, name)
+            mask = self._stale_mask(pq.read_table(path, columns=['source', 'etag']), removed, replaced)
+            stale = pc.sum(mask).as_py() or 0
+            if not stale:
+                continue
+            # Rewrite only the part files holding stale rows, through a hidden
+            # temporary file that readers skip (see open_dataset)
+            table = pq.read_table(path, schema=RESULTS_SCHEMA)
+            kept = table.filter(pc.invert(mask))
+            if kept.num_rows:
+                tmp_path = os.path.join(self.path, f'.{name}.tmp')
+                try:
+                    pq.write_table(kept, tmp_path, compression='zstd')
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+            else:
+                os.remove(path)
+            deleted += stale
+        return deleted
+
+    def _delete_lance(self, removed, replaced):
+        dataset = _import_lance().dataset(self.path)
+        before = dataset.count_rows()
+
+        def quote(value):
+            return "'" + value.replace("'", "''") + "'"
+
+        removed = list(removed)
+        for start in range(0, len(removed), 500):
+            sources = ', '.join(quote(source) for source in removed[start:start + 500])
+            dataset.delete(f'source IN ({sources})')
+        for source, etag in replaced.items():
+            dataset.delete(f'source = {quote(source)} AND (etag IS NULL OR etag != {quote(etag)})')
+        return before - dataset.count_rows()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_dataset(path, format='parquet'):
+    """Open a results dataset for queries (a pyarrow or Lance dataset)"""
+    if format == 'lance':
+        return _import_lance().dataset(path)
+    # Skip temporary files of writes in progress
+    return ds.dataset(path, format='parquet', schema=RESULTS_SCHEMA, ignore_prefixes=['.', '_'])
+
+
+def load_manifest(path, format='parquet'):
+    """
+    Latest analyzed version of every source in a results dataset
+
+    Returns {source: {'etag': ..., 'last_modified': ...}} from the most recently
+    analyzed row of each source (empty if the dataset doesn't exist yet).
+    """
+    if not os.path.exists(path):
+        return {}
+    columns = ['source', 'etag', 'last_modified', 'analyzed_at']
+    table = open_dataset(path, format).to_table(columns=columns)
+    table = table.filter(pc.is_valid(table.column('source')))
+    table = table.sort_by([('analyzed_at', 'ascending')])
+
+    manifest = {}
+    for source, etag, last_modified in zip(table.column('source').to_pylist(),
+                                           table.column('etag').to_pylist(),
+                                           table.column('last_modified').to_pylist()):
+        manifest[source] = {'etag': etag, 'last_modified': last_modified}
+    return manifest
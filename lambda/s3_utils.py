@@ -0,0 +1,93 @@
+from metrics import METRICS
+
+# Rekognition only accepts JPEG and PNG images
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def key_matches(key, suffix=None, extensions=IMAGE_EXTENSIONS):
+    """Check an object key against the suffix and extension filters"""
+    if key.endswith('/'):  # Folder placeholder objects
+        return False
+    if suffix and not key.endswith(suffix):
+        return False
+    if extensions and not key.lower().endswith(tuple(ext.lower() for ext in extensions)):
+        return False
+    return True
+
+
+def download_object(s3, bucket_name, key):
+    """Download an object's bytes"""
+    with METRICS.timer('download', source='s3'):
+        return s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+
+
+def download_object_into(s3, bucket_name, key, buffer_pool, size=None, chunk_size=1024 * 1024):
+    """
+    Stream an object into a buffer from buffer_pool, returning the bytearray
+
+    The buffer is sized before any data arrives, so the pool can hold the
+    download back until its memory budget allows it, and the body is copied in
+    chunk by chunk instead of being read into one new bytes object. Pass the
+    listed object size to wait for the buffer before the request is sent rather
+    than with a response open. Return the buffer with buffer_pool.release().
+    """
+    buffer = buffer_pool.acquire(size) if size is not None else None
+    with METRICS.timer('download', source='s3'):
+        try:
+            response = s3.get_object(Bucket=bucket_name, Key=key)
+        except Exception:
+            if buffer is not None:
+                buffer_pool.release(buffer)
+            raise
+        size = response['ContentLength']
+        if buffer is not None and len(buffer) != size:
+            # The object changed since it was listed
+            buffer_pool.release(buffer)
+            buffer = None
+        if buffer is None:
+            buffer = buffer_pool.acquire(size)
+        try:
+            offset = 0
+            # The view must be released before the pool can resize the buffer again
+            with memoryview(buffer) as view:
+                for chunk in response['Body'].iter_chunks(chunk_size):
+                    end = offset + len(chunk)
+                    if end > size:
+                        raise IOError(f"s3://{bucket_name}/{key} is longer than its ContentLength")
+                    view[offset:end] = chunk
+                    offset = end
+            if offset != size:
+                raise IOError(f"s3://{bucket_name}/{key} ended after {offset} of {size} bytes")
+            return buffer
+        except Exception:
+            buffer_pool.release(buffer)
+            raise
+        finally:
+            response['Body'].close()
+
+
+def iter_bucket_objects(s3, bucket_name, prefix='', suffix=None, extensions=IMAGE_EXTENSIONS,
+                        start_after=None, page_size=1000):
+    """
+    Yield object summaries from a bucket one page at a time
+
+    Follows continuation tokens so buckets with more than 1,000 keys are listed
+    completely, and yields each page's matching objects as soon as it arrives.
+    start_after resumes listing after the given key (keys are listed in UTF-8
+    binary order).
+    """
+    params = {'Bucket': bucket_name, 'MaxKeys': page_size}
+    if prefix:
+        params['Prefix'] = prefix
+    if start_after:
+        params['StartAfter'] = start_after
+
+    while True:
+        response = s3.list_objects_v2(**params)
+        for obj in response.get('Contents', []):
+            if key_matches(obj['Key'], suffix, extensions):
+                yield obj
+
+        if not response.get('IsTruncated'):
+            break
+        params['ContinuationToken'] = response['NextContinuationToken']
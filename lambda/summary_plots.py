@@ -0,0 +1,310 @@
+import threading
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from checkpoint import atomic_write
+from metrics import METRICS
+
+# Emotion types Rekognition reports for every face
+EMOTION_TYPES = ('HAPPY', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED', 'SURPRISED', 'CALM', 'FEAR', 'UNKNOWN')
+
+# Number of labels shown in the top labels chart
+TOP_LABELS = 8
+
+# Age histogram bin edges used by the reusable template and the run dashboard
+AGE_BINS = np.arange(0, 101, 10)
+
+COUNT_COLORS = ['gold', 'mediumpurple', 'orange']
+
+
+def summarize_results(results):
+    """
+    Statistics shown in the summary plot for one image's results
+
+    Returns a dict with 'emotions' ({type: highest confidence across faces}),
+    'ages' (midpoint of each face's age range), 'top_labels' ([(name,
+    confidence)] for the most confident labels) and 'counts' (faces, labels and
+    labels with boxes).
+    """
+    faces = results.get('faces', [])
+    labels = results.get('labels', [])
+
+    emotions = {}
+    for face in faces:
+        for emotion in face.get('Emotions', []):
+            emotion_type = emotion['Type']
+            emotions[emotion_type] = max(emotions.get(emotion_type, 0), emotion['Confidence'])
+
+    ages = []
+    for face in faces:
+        age_range = face.get('AgeRange', {})
+        if age_range:
+            ages.append((age_range.get('Low', 0) + age_range.get('High', 0)) / 2)
+
+    top_labels = sorted(labels, key=lambda x: x['Confidence'], reverse=True)[:TOP_LABELS]
+
+    return {
+        'emotions': emotions,
+        'ages': ages,
+        'top_labels': [(label['Name'], label['Confidence']) for label in top_labels],
+        'counts': {
+            'Faces': len(faces),
+            'Total Labels': len(labels),
+            'Labels w/ Boxes': sum(1 for label in labels if label.get('Instances')),
+        },
+    }
+
+
+class SummaryFigureTemplate:
+    """
+    Summary figure built once and reused for every image
+
+    The figure, axes, bars and text artists are created and laid out once; each
+    image only updates bar heights, tick labels and texts before the figure is
+    drawn again. Uses the object-oriented Figure API, so it has no pyplot state
+    and needs no plt.close(). Keep one template per thread.
+
+    Unlike the per-image figure, the emotion chart always lists the same emotion
+    types and ages use fixed ten-year bins, so the layout never changes.
+    """
+
+    def __init__(self, figsize=(15, 10)):
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        (ax1, ax2), (ax3, ax4) = self.figure.subplots(2, 2)
+        self.axes = (ax1, ax2, ax3, ax4)
+        self.title = self.figure.suptitle('', fontsize=16, fontweight='bold')
+
+        # Emotions
+        self.emotion_bars = ax1.bar(EMOTION_TYPES, [0] * len(EMOTION_TYPES), color='skyblue', alpha=0.8)
+        self.emotion_texts = [ax1.text(bar.get_x() + bar.get_width()/2, 0, '', ha='center', va='bottom',
+                                       fontweight='bold') for bar in self.emotion_bars]
+        ax1.set_title('Detected Emotions (Max Confidence)', fontweight='bold')
+        ax1.set_ylabel('Confidence %')
+        ax1.set_ylim(0, 110)
+        ax1.tick_params(axis='x', rotation=45)
+
+        # Ages
+        widths = np.diff(AGE_BINS)
+        self.age_bars = ax2.bar(AGE_BINS[:-1], [0] * len(widths), width=widths, align='edge',
+                                color='lightcoral', alpha=0.8, edgecolor='black')
+        ax2.set_title('Age Distribution', fontweight='bold')
+        ax2.set_xlabel('Age')
+        ax2.set_ylabel('Count')
+        ax2.set_xlim(AGE_BINS[0], AGE_BINS[-1])
+
+        # Top labels, most confident at the bottom as barh draws them
+        positions = np.arange(TOP_LABELS)
+        self.label_bars = ax3.barh(positions, [0] * TOP_LABELS, color='lightgreen', alpha=0.8)
+        self.label_texts = [ax3.text(0, bar.get_y() + bar.get_height()/2, '', ha='left', va='center',
+                                     fontweight='bold') for bar in self.label_bars]
+        ax3.set_yticks(positions)
+        ax3.set_title('Top Detected Objects/Labels', fontweight='bold')
+        ax3.set_xlabel('Confidence %')
+        ax3.set_xlim(0, 110)
+
+        # Counts
+        count_names = ['Faces', 'Total Labels', 'Labels w/ Boxes']
+        self.count_bars = ax4.bar(count_names, [0] * 3, color=COUNT_COLORS, alpha=0.8)
+        self.count_texts = [ax4.text(bar.get_x() + bar.get_width()/2, 0, '', ha='center', va='bottom',
+                                     fontweight='bold', fontsize=12) for bar in self.count_bars]
+        ax4.set_title('Detection Counts', fontweight='bold')
+        ax4.set_ylabel('Count')
+
+        # Shown instead of a chart when there is nothing to plot
+        self.empty_texts = [ax.text(0.5, 0.5, '', ha='center', va='center', transform=ax.transAxes,
+                                    fontsize=14) for ax in (ax1, ax2, ax3)]
+
+        ax3.set_yticklabels(['Placeholder label'] * TOP_LABELS)
+        # The title is still empty here, so reserve its band at the top
+        self.figure.tight_layout(rect=(0, 0, 1, 0.95))
+
+    @METRICS.timed('render', figure='summary_template')
+    def update(self, results, image_name, stats=None):
+        """Show one image's results; stats from summarize_results can be passed in"""
+        stats = stats or summarize_results(results)
+        self.title.set_text(f'Detection Summary: {image_name}')
+        has_faces = stats['counts']['Faces'] > 0
+
+        for bar, text, emotion in zip(self.emotion_bars, self.emotion_texts, EMOTION_TYPES):
+            score = stats['emotions'].get(emotion, 0) if has_faces else 0
+            bar.set_height(score)
+            text.set_y(score + 1)
+            text.set_text(f'{score:.1f}%' if score else '')
+        self.empty_texts[0].set_text('' if has_faces else 'No Faces Detected')
+
+        counts, _ = np.histogram(np.clip(stats['ages'], AGE_BINS[0], AGE_BINS[-1]), bins=AGE_BINS)
+        for bar, count in zip(self.age_bars, counts):
+            bar.set_height(count)
+        self.axes[1].set_ylim(0, max(1, counts.max(initial=0)) * 1.1)
+        if not has_faces:
+            self.empty_texts[1].set_text('No Faces Detected')
+        else:
+            self.empty_texts[1].set_text('' if stats['ages'] else 'No Age Data')
+
+        top_labels = stats['top_labels']
+        tick_labels = []
+        for i, (bar, text) in enumerate(zip(self.label_bars, self.label_texts)):
+            name, score = top_labels[i] if i < len(top_labels) else ('', 0)
+            bar.set_width(score)
+            text.set_x(score + 1)
+            text.set_text(f'{score:.1f}%' if name else '')
+            tick_labels.append(name)
+        self.axes[2].set_yticklabels(tick_labels)
+        self.empty_texts[2].set_text('' if top_labels else 'No Objects Detected')
+
+        values = list(stats['counts'].values())
+        for bar, text, count in zip(self.count_bars, self.count_texts, values):
+            bar.set_height(count)
+            text.set_y(count + 0.1)
+            text.set_text(str(count))
+        self.axes[3].set_ylim(0, max(1, max(values)) * 1.15)
+        return self.figure
+
+    @METRICS.timed('save', output='png')
+    def save(self, filepath, dpi=150):
+        """Draw the current state to a PNG file"""
+        with atomic_write(filepath) as tmp_path:
+            self.figure.savefig(tmp_path, dpi=dpi, facecolor='white')
+        return filepath
+
+
+class SummaryAggregator:
+    """
+    Running statistics across every image in a run, for one dashboard figure
+
+    Merges summarize_results() of each image into fixed-size accumulators: per
+    emotion sums, an age histogram, totals and per-label image counts (bounded by
+    Rekognition's label vocabulary, and capped at max_labels). Memory stays
+    constant however many images are added. Thread-safe.
+    """
+
+    def __init__(self, max_labels=10000):
+        self.max_labels = max_labels
+        self.lock = threading.Lock()
+        self.images = 0
+        self.images_with_faces = 0
+        self.emotion_sums = dict.fromkeys(EMOTION_TYPES, 0.0)
+        self.emotion_images = dict.fromkeys(EMOTION_TYPES, 0)
+        self.age_counts = np.zeros(len(AGE_BINS) - 1, dtype=np.int64)
+        self.age_sum = 0.0
+        self.age_count = 0
+        self.label_images = {}
+        self.other_labels = 0
+        self.counts = {'Faces': 0, 'Total Labels': 0, 'Labels w/ Boxes': 0}
+
+    def add(self, results, stats=None):
+        """Merge one image's results; stats from summarize_results can be passed in"""
+        stats = stats or summarize_results(results)
+        ages = np.clip(stats['ages'], AGE_BINS[0], AGE_BINS[-1])
+        age_counts, _ = np.histogram(ages, bins=AGE_BINS)
+        names = {label['Name'] for label in results.get('labels', [])}
+
+        with self.lock:
+            self.images += 1
+            if stats['counts']['Faces']:
+                self.images_with_faces += 1
+            for emotion, confidence in stats['emotions'].items():
+                self.emotion_sums[emotion] = self.emotion_sums.get(emotion, 0.0) + confidence
+                self.emotion_images[emotion] = self.emotion_images.get(emotion, 0) + 1
+            self.age_counts += age_counts
+            self.age_sum += float(np.sum(stats['ages']))
+            self.age_count += len(stats['ages'])
+            for name in names:
+                if name in self.label_images:
+                    self.label_images[name] += 1
+                elif len(self.label_images) < self.max_labels:
+                    self.label_images[name] = 1
+                else:
+                    self.other_labels += 1
+            for key, value in stats['counts'].items():
+                self.counts[key] += value
+            return self.images
+
+    def to_dict(self, top=20):
+        """JSON-friendly snapshot of the aggregated statistics"""
+        with self.lock:
+            top_labels = sorted(self.label_images.items(), key=lambda item: item[1], reverse=True)[:top]
+            return {
+                'images': self.images,
+                'images_with_faces': self.images_with_faces,
+                'counts': dict(self.counts),
+                'mean_emotion_confidence': {
+                    emotion: self.emotion_sums[emotion] / count
+                    for emotion, count in self.emotion_images.items() if count
+                },
+                'age_histogram': {f'{low}-{high}': int(count) for low, high, count
+                                  in zip(AGE_BINS[:-1], AGE_BINS[1:], self.age_counts)},
+                'mean_age': self.age_sum / self.age_count if self.age_count else None,
+                'top_labels': dict(top_labels),
+                'other_labels': self.other_labels,
+            }
+
+    @METRICS.timed('render', figure='dashboard')
+    def build_figure(self, title='Run Summary'):
+        """Dashboard figure (OO API, no pyplot state) of everything added so far"""
+        data = self.to_dict(top=TOP_LABELS * 2)
+        figure = Figure(figsize=(15, 10))
+        FigureCanvasAgg(figure)
+        (ax1, ax2), (ax3, ax4) = figure.subplots(2, 2)
+        figure.suptitle(f"{title}: {data['images']} images", fontsize=16, fontweight='bold')
+
+        emotions = data['mean_emotion_confidence']
+        if emotions:
+            bars = ax1.bar(list(emotions), list(emotions.values()), color='skyblue', alpha=0.8)
+            for bar, score in zip(bars, emotions.values()):
+                ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1,
+                         f'{score:.1f}%', ha='center', va='bottom', fontweight='bold')
+            ax1.tick_params(axis='x', rotation=45)
+        else:
+            ax1.text(0.5, 0.5, 'No Faces Detected', ha='center', va='center',
+                     transform=ax1.transAxes, fontsize=14)
+        ax1.set_title('Emotions (Mean Max Confidence per Image)', fontweight='bold')
+        ax1.set_ylabel('Confidence %')
+
+        if data['mean_age'] is not None:
+            ax2.bar(AGE_BINS[:-1], list(data['age_histogram'].values()), width=np.diff(AGE_BINS), align='edge',
+                    color='lightcoral', alpha=0.8, edgecolor='black')
+            ax2.set_xlabel('Age')
+            ax2.set_ylabel('Faces')
+        else:
+            ax2.text(0.5, 0.5, 'No Age Data', ha='center', va='center',
+                     transform=ax2.transAxes, fontsize=14)
+        mean_age = f" (mean {data['mean_age']:.1f})" if data['mean_age'] is not None else ''
+        ax2.set_title(f'Age Distribution{mean_age}', fontweight='bold')
+
+        top_labels = data['top_labels']
+        if top_labels:
+            names = list(top_labels)[::-1]
+            values = [top_labels[name] for name in names]
+            bars = ax3.barh(names, values, color='lightgreen', alpha=0.8)
+            for bar, value in zip(bars, values):
+                ax3.text(bar.get_width(), bar.get_y() + bar.get_height()/2,
+                         f' {value}', ha='left', va='center', fontweight='bold')
+            ax3.set_xlabel('Images')
+        else:
+            ax3.text(0.5, 0.5, 'No Objects Detected', ha='center', va='center',
+                     transform=ax3.transAxes, fontsize=14)
+        ax3.set_title('Most Common Labels', fontweight='bold')
+
+        counts = {'Images': data['images'], 'w/ Faces': data['images_with_faces'], **data['counts']}
+        bars = ax4.bar(list(counts), list(counts.values()),
+                       color=['lightsteelblue', 'salmon'] + COUNT_COLORS, alpha=0.8)
+        for bar, count in zip(bars, counts.values()):
+            ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height(),
+                     str(count), ha='center', va='bottom', fontweight='bold', fontsize=12)
+        ax4.set_title('Detection Totals', fontweight='bold')
+        ax4.tick_params(axis='x', rotation=15)
+
+        figure.tight_layout()
+        return figure
+
+    @METRICS.timed('save', output='dashboard')
+    def save(self, filepath, title='Run Summary'):
+        """Render the dashboard to a PNG, replacing any previous snapshot atomically"""
+        figure = self.build_figure(title)
+        with atomic_write(filepath) as tmp_path:
+            figure.savefig(tmp_path, dpi=120, facecolor='white')
+        return filepath
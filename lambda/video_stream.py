@@ -1,24 +1,131 @@
 import cv2
-import boto3
 import json
 import time
+import threading
 from botocore.exceptions import ClientError
 import base64
 from io import BytesIO
+from result_cache import ResultCache, image_digest
+from metrics import METRICS, export_from_env
+from rate_limit import RateLimitedCaller
+from aws_clients import CALLER_RETRIES, get_client
+from frame_sampling import AdaptiveScheduler, FixedIntervalScheduler, SceneChangeGate
+
+FACE_PARAMS = {'Attributes': ['ALL']}  # Get all face attributes
+LABEL_PARAMS = {'MaxLabels': 10, 'MinConfidence': 70}
+
+class FrameAnalysisWorker:
+    """
+    Background thread that analyzes frames off the capture/display loop
+    
+    Frames are handed over through a single latest-frame-wins slot: submitting a
+    frame while another is still waiting replaces it, so the worker always picks
+    up the newest frame and never builds a backlog.
+    """
+    
+    def __init__(self, analyzer, on_complete=None):
+        """
+        on_complete is called with the analysis duration in seconds after each frame
+        """
+        self.analyzer = analyzer
+        self.on_complete = on_complete
+        self.condition = threading.Condition()
+        self.pending = None  # (frame_count, frame) waiting to be analyzed
+        self.results = None  # (frame_count, faces, labels) of the last finished analysis
+        self.busy = False
+        self.running = True
+        self.submitted = 0
+        self.replaced = 0
+        self.thread = threading.Thread(target=self._run, name='frame-analysis', daemon=True)
+        self.thread.start()
+    
+    def submit(self, frame, frame_count):
+        """
+        Queue a frame for analysis, replacing any frame still waiting
+        """
+        with self.condition:
+            if self.pending is not None:
+                self.replaced += 1
+            # Copy so later drawing on the display frame doesn't leak into the analysis
+            self.pending = (frame_count, frame.copy())
+            self.submitted += 1
+            self.condition.notify()
+    
+    def latest(self):
+        """
+        Return (frame_count, faces, labels) of the newest finished analysis, or None
+        """
+        with self.condition:
+            return self.results
+    
+    def is_busy(self):
+        with self.condition:
+            return self.busy or self.pending is not None
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frame_count, frame = self.pending
+                self.pending = None
+                self.busy = True
+            
+            try:
+                start = time.perf_counter()
+                image_bytes = self.analyzer.encode_image(frame)
+                faces = self.analyzer.detect_faces(image_bytes)
+                labels = self.analyzer.detect_labels(image_bytes)
+                if self.on_complete is not None:
+                    self.on_complete(time.perf_counter() - start)
+                if faces is None or labels is None:
+                    # Keep showing the previous results rather than an empty frame
+                    print(f"⚠️  Analysis of frame {frame_count} failed, keeping previous results")
+                    continue
+                self.analyzer.print_detection_results(faces, labels, frame_count)
+                with self.condition:
+                    self.results = (frame_count, faces, labels)
+            except Exception as e:
+                print(f"Error analyzing frame {frame_count}: {e}")
+            finally:
+                with self.condition:
+                    self.busy = False
+    
+    def stop(self, timeout=5):
+        """
+        Stop the worker, waiting up to timeout seconds for an in-progress analysis
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout)
+
 
 class RekognitionVideoAnalyzer:
-    def __init__(self, region_name='us-east-1'):
+    def __init__(self, region_name='us-east-1', cache=None, endpoint_url=None, rekognition_client=None,
+                 caller=None):
         """
         Initialize the Rekognition client
         Make sure your AWS credentials are configured via AWS CLI or environment variables
+        cache is an optional ResultCache consulted before every Rekognition call
+        endpoint_url or rekognition_client select another backend (see fake_aws.py)
+        caller is the RateLimitedCaller used for every Rekognition call
         """
+        self.region_name = region_name
+        self.cache = cache
+        self.caller = caller or RateLimitedCaller()
         try:
-            self.rekognition = boto3.client('rekognition', region_name=region_name)
+            self.rekognition = rekognition_client or get_client(
+                'rekognition', region_name=region_name, endpoint_url=endpoint_url, **CALLER_RETRIES
+            )
             print("✓ AWS Rekognition client initialized successfully")
         except Exception as e:
             print(f"✗ Error initializing AWS Rekognition: {e}")
             raise
     
+    @METRICS.timed('encode')
     def encode_image(self, frame):
         """
         Convert OpenCV frame to bytes for Rekognition API
@@ -27,35 +134,69 @@ class RekognitionVideoAnalyzer:
         _, buffer = cv2.imencode('.jpg', frame)
         return buffer.tobytes()
     
+    def _cache_key(self, image_bytes, operation, params):
+        """
+        Cache key for a request, or None when caching is disabled
+        """
+        if self.cache is None:
+            return None
+        return ResultCache.make_key(image_digest(image_bytes), operation, params, self.region_name)
+    
     def detect_faces(self, image_bytes):
         """
         Detect faces in the image using Rekognition
+        Returns None if the call failed (after retrying throttling errors)
         """
+        cache_key = self._cache_key(image_bytes, 'detect_faces', FACE_PARAMS)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            response = self.rekognition.detect_faces(
-                Image={'Bytes': image_bytes},
-                Attributes=['ALL']  # Get all face attributes
-            )
-            return response.get('FaceDetails', [])
+            with METRICS.timer('rekognition', operation='faces'):
+                response = self.caller.call(
+                    'detect_faces',
+                    self.rekognition.detect_faces,
+                    Image={'Bytes': image_bytes},
+                    **FACE_PARAMS
+                )
+            faces = response.get('FaceDetails', [])
+            if cache_key is not None:
+                self.cache.put(cache_key, faces)
+            return faces
         except ClientError as e:
             print(f"Error detecting faces: {e}")
-            return []
+            return None
     
     def detect_labels(self, image_bytes):
         """
         Detect objects/labels in the image using Rekognition
+        Returns None if the call failed (after retrying throttling errors)
         """
+        cache_key = self._cache_key(image_bytes, 'detect_labels', LABEL_PARAMS)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            response = self.rekognition.detect_labels(
-                Image={'Bytes': image_bytes},
-                MaxLabels=10,
-                MinConfidence=70
-            )
-            return response.get('Labels', [])
+            with METRICS.timer('rekognition', operation='labels'):
+                response = self.caller.call(
+                    'detect_labels',
+                    self.rekognition.detect_labels,
+                    Image={'Bytes': image_bytes},
+                    **LABEL_PARAMS
+                )
+            labels = response.get('Labels', [])
+            if cache_key is not None:
+                self.cache.put(cache_key, labels)
+            return labels
         except ClientError as e:
             print(f"Error detecting labels: {e}")
-            return []
+            return None
     
+    @METRICS.timed('draw')
     def draw_face_boxes(self, frame, faces):
         """
         Draw bounding boxes around detected faces
@@ -126,9 +267,22 @@ class RekognitionVideoAnalyzer:
         
         print("-" * 40)
     
-    def run_video_analysis(self, analyze_every_n_frames=30):
+    def run_video_analysis(self, analyze_every_n_frames=30, async_analysis=True, scheduler=None,
+                           scene_gate=None):
         """
         Main function to run video analysis
+        
+        scheduler is a SamplingScheduler choosing which frames to analyze; the
+        default analyzes every analyze_every_n_frames frames, at most once every
+        2 seconds. scene_gate is an optional SceneChangeGate; scheduled frames it
+        finds unchanged since the last analyzed frame are skipped and the previous
+        results are kept. Pressing space always analyzes. The scheduler's metrics()
+        (such as its current analysis rate) are kept as scheduler_* gauges in METRICS.
+        
+        With async_analysis=True frames are analyzed by a background worker and
+        the latest results are drawn on every following frame, so capture and
+        display keep their frame rate while Rekognition calls are in flight. With
+        async_analysis=False each analysis blocks the loop, as before.
         """
         # Initialize webcam
         cap = cv2.VideoCapture(0)
@@ -140,14 +294,21 @@ class RekognitionVideoAnalyzer:
         print("✓ Webcam initialized")
         print("📹 Starting video analysis...")
         print("Press 'q' to quit, 'space' to analyze current frame")
-        print("Automatic analysis every {} frames".format(analyze_every_n_frames))
+        if scheduler is None:
+            scheduler = FixedIntervalScheduler(analyze_every_n_frames, min_interval=2)
+            print("Automatic analysis every {} frames".format(analyze_every_n_frames))
+        else:
+            print(f"Automatic analysis scheduled by {type(scheduler).__name__}")
         
+        scheduler_name = type(scheduler).__name__
         frame_count = 0
-        last_analysis_time = time.time()
+        last_faces = []
+        worker = FrameAnalysisWorker(self, on_complete=scheduler.record_latency) if async_analysis else None
         
         try:
             while True:
-                ret, frame = cap.read()
+                with METRICS.timer('capture'):
+                    ret, frame = cap.read()
                 if not ret:
                     print("✗ Error: Could not read frame")
                     break
@@ -155,40 +316,66 @@ class RekognitionVideoAnalyzer:
                 frame_count += 1
                 current_time = time.time()
                 
-                # Analyze frame automatically every N frames or when spacebar is pressed
-                analyze_frame = False
+                # Analyze frame when the scheduler picks it or when spacebar is pressed
                 key = cv2.waitKey(1) & 0xFF
-                
-                if key == ord(' '):  # Spacebar pressed
-                    analyze_frame = True
-                elif frame_count % analyze_every_n_frames == 0:  # Automatic analysis
-                    analyze_frame = True
-                elif key == ord('q'):  # Quit
+                if key == ord('q'):  # Quit
                     break
                 
-                if analyze_frame and (current_time - last_analysis_time) > 2:  # Limit to once every 2 seconds
-                    print(f"\n🔄 Analyzing frame {frame_count}...")
-                    
-                    # Convert frame to bytes
-                    image_bytes = self.encode_image(frame)
-                    
-                    # Detect faces and objects
-                    faces = self.detect_faces(image_bytes)
-                    labels = self.detect_labels(image_bytes)
+                scheduler.observe_frame(frame)
+                force = key == ord(' ')
+                if scheduler.should_analyze(frame_count, current_time, force=force):
+                    if scene_gate is not None and not force and not scene_gate.check(frame):
+                        # Static scene: keep the previous results instead of calling the API
+                        scheduler.mark_skipped(current_time)
+                        if worker is None:
+                            frame = self.draw_face_boxes(frame, last_faces)
+                    else:
+                        print(f"\n🔄 Analyzing frame {frame_count}...")
+                        scheduler.mark_analyzed(current_time)
                     
-                    # Print results to CLI
-                    self.print_detection_results(faces, labels, frame_count)
-                    
-                    # Draw face boxes on frame
-                    frame = self.draw_face_boxes(frame, faces)
-                    
-                    last_analysis_time = current_time
+                        if worker is not None:
+                            worker.submit(frame, frame_count)
+                        else:
+                            # Convert frame to bytes
+                            start = time.perf_counter()
+                            image_bytes = self.encode_image(frame)
+                        
+                            # Detect faces and objects
+                            faces = self.detect_faces(image_bytes)
+                            labels = self.detect_labels(image_bytes)
+                            scheduler.record_latency(time.perf_counter() - start)
+                        
+                            if faces is None or labels is None:
+                                print(f"⚠️  Analysis of frame {frame_count} failed, keeping previous results")
+                            else:
+                                # Print results to CLI
+                                self.print_detection_results(faces, labels, frame_count)
+                                last_faces = faces
+                        
+                            # Draw face boxes on frame
+                            frame = self.draw_face_boxes(frame, last_faces)
+                
+                if worker is not None:
+                    # Keep showing the most recent results until newer ones arrive
+                    latest = worker.latest()
+                    if latest is not None:
+                        frame = self.draw_face_boxes(frame, latest[1])
+                    if worker.is_busy():
+                        cv2.putText(frame, "Analyzing...", 
+                                   (10, 95), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
                 
                 # Add instructions to frame
                 cv2.putText(frame, "Press SPACE to analyze, Q to quit", 
                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
                 cv2.putText(frame, f"Frame: {frame_count}", 
                            (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                for name, value in scheduler.metrics(current_time).items():
+                    METRICS.set_gauge(f'scheduler_{name}', value, scheduler=scheduler_name)
+                cv2.putText(frame, f"Analysis rate: {scheduler.current_rate(current_time):.2f}/s", 
+                           (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                if scene_gate is not None:
+                    cv2.putText(frame, f"Skipped (static): {scene_gate.skip_ratio():.0%}", 
+                               (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
                 
                 # Display frame
                 cv2.imshow('AWS Rekognition Video Analysis', frame)
@@ -198,8 +385,13 @@ class RekognitionVideoAnalyzer:
         
         finally:
             # Clean up
+            if worker is not None:
+                worker.stop()
             cap.release()
             cv2.destroyAllWindows()
+            if scene_gate is not None:
+                print(f"⏭️  Skipped {scene_gate.skipped} of {scene_gate.checked} scheduled frames "
+                      f"as unchanged ({scene_gate.skip_ratio():.0%})")
             print("✓ Resources cleaned up")
 
 def main():
@@ -213,8 +405,9 @@ def main():
         # Initialize analyzer
         analyzer = RekognitionVideoAnalyzer(region_name='us-east-1')  # Change region if needed
         
-        # Run video analysis
-        analyzer.run_video_analysis(analyze_every_n_frames=60)  # Analyze every 60 frames
+        # Run video analysis, staying within 1 Rekognition call per second
+        analyzer.run_video_analysis(scheduler=AdaptiveScheduler(max_calls_per_second=1.0),
+                                    scene_gate=SceneChangeGate())
         
     except Exception as e:
         print(f"✗ Application error: {e}")
@@ -223,6 +416,9 @@ def main():
         print("2. You have permissions for Rekognition")
         print("3. Your webcam is connected and working")
         print("4. Required packages are installed (pip install opencv-python boto3)")
+    
+    finally:
+        export_from_env()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip('boto3')
+
+from botocore.exceptions import ClientError
+
+from aws_clients import CALLER_RETRIES, clear_clients, get_client
+from fake_aws import FakeRekognitionClient, FakeRekognitionServer
+from rate_limit import RateLimitedCaller
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    clear_clients()
+    yield
+    clear_clients()
+
+
+def test_caller_retries_are_the_only_retries():
+    fake = FakeRekognitionClient(latency=0, throttle_rate=1.0)
+    with FakeRekognitionServer(fake) as server:
+        client = get_client('rekognition', region_name='us-east-1',
+                            endpoint_url=server.endpoint_url, **CALLER_RETRIES)
+        caller = RateLimitedCaller(max_attempts=2, base_delay=0)
+        with pytest.raises(ClientError):
+            caller.call('detect_labels', client.detect_labels, Image={'Bytes': b'image'})
+
+    assert fake.calls['DetectLabels'] == 2
+    assert caller.stats() == {'calls': 1, 'retries': 1, 'drops': 1}
+
+
+def test_caller_clients_make_a_single_attempt():
+    client = get_client('rekognition', region_name='us-east-1', **CALLER_RETRIES)
+    assert client.meta.config.retries['total_max_attempts'] == 1
+
+
+def test_clients_are_cached_per_config():
+    first = get_client('rekognition', region_name='us-east-1', max_attempts=1)
+    assert get_client('rekognition', region_name='us-east-1', max_attempts=1) is first
+    other = get_client('rekognition', region_name='us-east-1', max_attempts=5)
+    assert other is not first
+    # botocore stores retries plus the first attempt
+    assert other.meta.config.retries['total_max_attempts'] == 6
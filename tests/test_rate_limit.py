@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip('botocore')
+
+from botocore.exceptions import EndpointConnectionError, ParamValidationError
+
+from rate_limit import RateLimitedCaller
+
+
+def flaky(failures, error):
+    """Function raising error for its first failures calls, then returning 'ok'"""
+    attempts = []
+
+    def func():
+        attempts.append(1)
+        if len(attempts) <= failures:
+            raise error
+        return 'ok'
+    return func, attempts
+
+
+def test_transport_errors_are_retried():
+    func, attempts = flaky(2, EndpointConnectionError(endpoint_url='http://127.0.0.1:1'))
+    caller = RateLimitedCaller(max_attempts=3, base_delay=0)
+    assert caller.call('detect_labels', func) == 'ok'
+    assert len(attempts) == 3
+    assert caller.stats() == {'calls': 1, 'retries': 2, 'drops': 0}
+
+
+def test_transport_errors_are_dropped_after_max_attempts():
+    func, attempts = flaky(5, EndpointConnectionError(endpoint_url='http://127.0.0.1:1'))
+    caller = RateLimitedCaller(max_attempts=2, base_delay=0)
+    with pytest.raises(EndpointConnectionError):
+        caller.call('detect_labels', func)
+    assert len(attempts) == 2
+    assert caller.stats() == {'calls': 1, 'retries': 1, 'drops': 1}
+
+
+def test_other_errors_are_not_retried():
+    func, attempts = flaky(5, ParamValidationError(report='bad'))
+    caller = RateLimitedCaller(max_attempts=3, base_delay=0)
+    with pytest.raises(ParamValidationError):
+        caller.call('detect_labels', func)
+    assert len(attempts) == 1
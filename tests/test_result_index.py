@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('matplotlib')
+
+from result_index import ResultIndex, parse_query
+
+
+def labels(**confidences):
+    return {'labels': [{'Name': name, 'Confidence': confidence} for name, confidence in confidences.items()]}
+
+
+def sunglasses(confidence):
+    return {'faces': [{'Sunglasses': {'Value': True, 'Confidence': confidence}}]}
+
+
+def test_parse_query():
+    assert parse_query('label:Car>=90') == ('label:car', 90.0)
+    assert parse_query('face:sunglasses') == ('face:sunglasses', 0.0)
+
+
+def test_parse_query_rejects_bad_confidence():
+    with pytest.raises(ValueError, match=r"'high' in query term 'label:Car>=high'"):
+        parse_query('label:Car>=high')
+
+
+def test_add_readd_and_remove():
+    index = ResultIndex()
+    index.add('a.jpg', labels(Car=95.0, Dog=80.0))
+    index.add('b.jpg', labels(Car=70.0))
+    assert index.search(['label:car']) == ['a.jpg', 'b.jpg']
+    assert index.search(['label:car>=90']) == ['a.jpg']
+    assert index.search(['label:car', 'label:dog']) == ['a.jpg']
+
+    # Re-adding replaces the image's previous terms
+    index.add('a.jpg', labels(Cat=88.0))
+    assert index.search(['label:car']) == ['b.jpg']
+    assert index.search(['label:dog']) == []
+    assert index.search(['label:cat']) == ['a.jpg']
+
+    index.remove('b.jpg')
+    assert index.search(['label:car']) == []
+    assert len(index) == 1
+    assert index.terms() == {'label:cat': 1}
+
+
+def test_confidence_bucket_boundaries():
+    index = ResultIndex()
+    index.add('below.jpg', labels(Car=89.99))
+    index.add('at.jpg', labels(Car=90.0))
+    index.add('top.jpg', labels(Car=100.0))
+    assert index.search(['label:car>=90']) == ['at.jpg', 'top.jpg']
+    assert index.search(['label:car>=89.99']) == ['at.jpg', 'below.jpg', 'top.jpg']
+    assert index.search(['label:car>=90.01']) == ['top.jpg']
+    assert index.search(['label:car>=100']) == ['top.jpg']
+
+
+def snapshot(index):
+    queries = ['label:car', 'label:car>=90', 'label:dog', 'face:sunglasses>=50']
+    return len(index), index.terms(), {query: index.search([query]) for query in queries}
+
+
+def test_rebuild_from_journal_and_after_compaction(tmp_path):
+    path = str(tmp_path / 'index.jsonl')
+    index = ResultIndex(path)
+    index.add('a.jpg', labels(Car=95.0, Dog=60.0))
+    index.add('b.jpg', labels(Car=89.99))
+    index.add('c.jpg', sunglasses(97.0))
+    index.add('a.jpg', labels(Car=91.0))
+    index.remove('b.jpg')
+    expected = snapshot(index)
+    index.close()
+
+    reloaded = ResultIndex(path)
+    assert snapshot(reloaded) == expected
+    reloaded.compact()
+    reloaded.close()
+    with open(path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+
+    compacted = ResultIndex(path)
+    assert snapshot(compacted) == expected
+    compacted.close()
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('matplotlib')
+
+from summary_plots import EMOTION_TYPES, SummaryFigureTemplate
+
+RESULTS = {
+    'faces': [{
+        'AgeRange': {'Low': 25, 'High': 35},
+        'Emotions': [{'Type': 'HAPPY', 'Confidence': 92.5}, {'Type': 'CALM', 'Confidence': 6.1}],
+    }],
+    'labels': [
+        {'Name': 'Person', 'Confidence': 99.1, 'Instances': [{'BoundingBox': {}}]},
+        {'Name': 'Outdoors', 'Confidence': 87.4, 'Instances': []},
+    ],
+}
+
+
+def test_template_title_clears_subplot_titles():
+    template = SummaryFigureTemplate()
+    figure = template.update(RESULTS, 'a_rather_long_image_name.jpg')
+    figure.canvas.draw()
+    renderer = figure.canvas.get_renderer()
+
+    title = template.title.get_window_extent(renderer)
+    for ax in template.axes[:2]:
+        assert title.y0 >= ax.title.get_window_extent(renderer).y1
+
+
+def test_template_keeps_unknown_emotion():
+    results = {'faces': [{'Emotions': [{'Type': 'UNKNOWN', 'Confidence': 71.0}]}], 'labels': []}
+    template = SummaryFigureTemplate()
+    template.update(results, 'unknown.jpg')
+    heights = dict(zip(EMOTION_TYPES, (bar.get_height() for bar in template.emotion_bars)))
+    assert heights['UNKNOWN'] == 71.0